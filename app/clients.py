@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+import time
+from starlette.concurrency import run_in_threadpool
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Registro de clientes de SDKs pesados (Secret Manager, Firebase Admin, Vertex AI).
+# Importar un SDK y construir su cliente cuesta cientos de ms; se hace en el primer uso
+# y no al importar app.main, para que el arranque en frío de Cloud Run no lo pague.
+
+class ClientRegistry:
+    """Construye cada cliente una sola vez, en el primer `get(name)`, con la factory registrada.
+
+    Desde código async se usa `aget(name)`: la primera construcción (import del SDK y
+    descubrimiento de credenciales, más de un segundo) corre en el threadpool y no congela
+    el event loop. El tiempo de cada construcción queda en metrics (`clients.init_ms.<name>`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._factories: dict[str, object] = {}
+        self._clients: dict[str, object] = {}
+
+    def register(self, name: str, factory):
+        self._factories[name] = factory
+
+    def get(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    t0 = time.perf_counter()
+                    client = self._factories[name]()
+                    metrics.observe_ms(f"clients.init_ms.{name}", (time.perf_counter() - t0) * 1000)
+                    self._clients[name] = client
+        return client
+
+    async def aget(self, name: str):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        return await run_in_threadpool(self.get, name)
+
+    async def warm(self, names: list[str]):
+        """Construye `names` en segundo plano; un error se ignora y se reintenta en el primer uso."""
+        for name in names:
+            try:
+                await self.aget(name)
+            except Exception:
+                metrics.incr(f"clients.warmup_failed.{name}")
+                logger.warning("%s no inicializado en el warm-up", name, exc_info=True)
+
+    def loaded(self) -> list[str]:
+        return sorted(self._clients)
+
+def _secretmanager():
+    from google.cloud import secretmanager
+    return secretmanager.SecretManagerServiceClient()
+
+def _firebase():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Inicializar Firebase Admin si no está inicializado
+    if not firebase_admin._apps:
+        credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
+        if credentials_path and os.path.exists(credentials_path):
+            cred = credentials.Certificate(credentials_path)
+            firebase_admin.initialize_app(cred)
+        else:
+            firebase_admin.initialize_app()
+    return firebase_admin.get_app()
+
+# Clientes que se construyen en segundo plano después del arranque (vacío para no hacerlo)
+CLIENTS_WARMUP = [n.strip() for n in os.getenv("CLIENTS_WARMUP", "vertex,firebase").split(",") if n.strip()]
+
+clients = ClientRegistry()
+clients.register("secretmanager", _secretmanager)
+clients.register("firebase", _firebase)
@@ -1,61 +1,76 @@
 import os
 from fastapi import Depends, HTTPException, status, Header
-from google.cloud import firestore
-import firebase_admin
-from firebase_admin import auth as fb_auth
+from starlette.concurrency import run_in_threadpool
+from .clients import clients
+from . import firestore_rpc
+from .token_verifier import verifier
 
 _db = None
+_async_db = None
+
+def _init_firebase():
+    # Firebase Admin se importa e inicializa en el primer uso (registro de clientes)
+    clients.get("firebase")
+
+def _project():
+    return os.getenv("GCLOUD_PROJECT") or os.getenv("GOOGLE_CLOUD_PROJECT")
 
 def get_db():
     global _db
     if _db is None:
-        from firebase_admin import credentials
-        import firebase_admin
-        
-        # Inicializar Firebase Admin si no está inicializado
-        if not firebase_admin._apps:
-            credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-            if credentials_path and os.path.exists(credentials_path):
-                cred = credentials.Certificate(credentials_path)
-                firebase_admin.initialize_app(cred)
-            else:
-                firebase_admin.initialize_app()
-        
-        project = os.getenv("GCLOUD_PROJECT") or os.getenv("GOOGLE_CLOUD_PROJECT")
-        _db = firestore.Client(project=project) if project else firestore.Client()
+        _init_firebase()
+        project = _project()
+        # Clientes con el canal gRPC instrumentado: cada round trip cuenta en X-Firestore-RPCs
+        _db = firestore_rpc.Client(project=project) if project else firestore_rpc.Client()
     return _db
 
+async def get_async_db():
+    """Cliente asíncrono de Firestore (grpc aio) para handlers `async def`.
+
+    Es una dependencia `async` para que FastAPI no la despache al threadpool de AnyIO:
+    se crea perezosamente dentro del event loop del servidor y las lecturas/escrituras
+    no ocupan hilos mientras esperan a Firestore.
+    """
+    global _async_db
+    if _async_db is None:
+        # Import e inicialización de Firebase Admin en el threadpool, no en el event loop
+        await clients.aget("firebase")
+        project = _project()
+        _async_db = firestore_rpc.AsyncClient(project=project) if project else firestore_rpc.AsyncClient()
+    return _async_db
+
 REQUIRE_AUTH = os.getenv("REQUIRE_AUTH", "false").lower() == "true"
 
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail,
+                         headers={"WWW-Authenticate": "Bearer"})
+
+def _user(claims: dict) -> dict:
+    return {"uid": claims["sub"], "email": claims.get("email"), "claims": claims}
+
 def verify_bearer(token: str | None):
+    """Verifica un ID token de Firebase (firma, aud, iss, exp, sub); ver app/token_verifier.py."""
     if not REQUIRE_AUTH:
         return None
     if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing bearer token")
+        raise _unauthorized("Missing bearer token")
     try:
-        if not firebase_admin._apps:
-            from firebase_admin import credentials
-            credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-            
-            if credentials_path and os.path.exists(credentials_path):
-                cred = credentials.Certificate(credentials_path)
-                firebase_admin.initialize_app(cred)
-            else:
-                firebase_admin.initialize_app()
-        
-        # Para desarrollo: aceptar custom tokens directamente
-        # En producción esto debería verificar ID tokens reales
-        if token.startswith('eyJ'):  # Es un JWT
-            return {"uid": "test-user-123"}  # Mock para desarrollo
-        else:
-            raise Exception("Invalid token format")
-            
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid token: {str(e)}")
-
-def auth_dependency(authorization: str | None = Header(None)):
+        return _user(verifier.verify(token))
+    except ValueError as e:
+        raise _unauthorized(f"Invalid token: {e}")
+    except OSError as e:
+        # No se pudieron descargar los certificados de Google
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Token verification unavailable: {e}")
+
+async def auth_dependency(authorization: str | None = Header(None)):
     token = None
     if authorization and authorization.startswith("Bearer "):
         token = authorization[7:]
+    if REQUIRE_AUTH and token:
+        # Camino habitual: token ya verificado (LRU hasta su exp), sin salir del event loop
+        claims = verifier.cached(token)
+        if claims is not None:
+            return _user(claims)
+        # Verificación RSA (y, a veces, descarga de certificados) fuera del event loop
+        return await run_in_threadpool(verify_bearer, token)
     return verify_bearer(token)
- 
\ No newline at end of file
@@ -0,0 +1,109 @@
+import re
+import grpc
+from google.cloud import firestore
+from google.cloud.firestore_v1.services.firestore import async_client as firestore_async_client
+from google.cloud.firestore_v1.services.firestore import client as firestore_sync_client
+from google.cloud.firestore_v1.services.firestore.transports import grpc as grpc_transport
+from google.cloud.firestore_v1.services.firestore.transports import grpc_asyncio as grpc_asyncio_transport
+from . import metrics
+
+# Conteo de round trips a Firestore en el canal gRPC: cada llamada que sale del cliente
+# (incluidos los reintentos) pasa por un interceptor y se registra con metrics.record_rpc,
+# que alimenta `firestore.rpc.<tipo>` y el header X-Firestore-RPCs. Ningún call site cuenta
+# a mano, así que una llamada nueva no puede quedar fuera.
+
+_KINDS = {
+    "Commit": "commit",
+    "GetDocument": "get",
+    "BatchGetDocuments": "get_all",
+    "RunQuery": "query",
+    "RunAggregationQuery": "query",
+}
+
+def rpc_kind(method) -> str:
+    """`/google.firestore.v1.Firestore/RunQuery` -> `query` (snake_case si no está en _KINDS)."""
+    if isinstance(method, bytes):
+        method = method.decode()
+    name = method.rsplit("/", 1)[-1]
+    return _KINDS.get(name) or re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+
+class _SyncCounter(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor,
+                   grpc.StreamUnaryClientInterceptor, grpc.StreamStreamClientInterceptor):
+    def intercept_unary_unary(self, continuation, details, request):
+        metrics.record_rpc(rpc_kind(details.method))
+        return continuation(details, request)
+
+    def intercept_unary_stream(self, continuation, details, request):
+        metrics.record_rpc(rpc_kind(details.method))
+        return continuation(details, request)
+
+    def intercept_stream_unary(self, continuation, details, request_iterator):
+        metrics.record_rpc(rpc_kind(details.method))
+        return continuation(details, request_iterator)
+
+    def intercept_stream_stream(self, continuation, details, request_iterator):
+        metrics.record_rpc(rpc_kind(details.method))
+        return continuation(details, request_iterator)
+
+class _AsyncUnaryUnary(grpc.aio.UnaryUnaryClientInterceptor):
+    async def intercept_unary_unary(self, continuation, details, request):
+        metrics.record_rpc(rpc_kind(details.method))
+        return await continuation(details, request)
+
+class _AsyncUnaryStream(grpc.aio.UnaryStreamClientInterceptor):
+    async def intercept_unary_stream(self, continuation, details, request):
+        metrics.record_rpc(rpc_kind(details.method))
+        return await continuation(details, request)
+
+class _AsyncStreamUnary(grpc.aio.StreamUnaryClientInterceptor):
+    async def intercept_stream_unary(self, continuation, details, request_iterator):
+        metrics.record_rpc(rpc_kind(details.method))
+        return await continuation(details, request_iterator)
+
+class _AsyncStreamStream(grpc.aio.StreamStreamClientInterceptor):
+    async def intercept_stream_stream(self, continuation, details, request_iterator):
+        metrics.record_rpc(rpc_kind(details.method))
+        return await continuation(details, request_iterator)
+
+def _async_interceptors() -> list:
+    return [_AsyncUnaryUnary(), _AsyncUnaryStream(), _AsyncStreamUnary(), _AsyncStreamStream()]
+
+class _CountingGrpcTransport(grpc_transport.FirestoreGrpcTransport):
+    @classmethod
+    def create_channel(cls, *args, **kwargs):
+        return grpc.intercept_channel(super().create_channel(*args, **kwargs), _SyncCounter())
+
+class _CountingGrpcAsyncIOTransport(grpc_asyncio_transport.FirestoreGrpcAsyncIOTransport):
+    @classmethod
+    def create_channel(cls, *args, **kwargs):
+        # Un canal aio solo acepta interceptores al crearse
+        return super().create_channel(*args, interceptors=_async_interceptors(), **kwargs)
+
+def _emulator_options(client) -> list:
+    # Mismo header que BaseClient._emulator_channel
+    token = getattr(client._credentials, "id_token", None) or "owner"
+    return [("Authorization", f"Bearer {token}")]
+
+class Client(firestore.Client):
+    """firestore.Client con el canal gRPC instrumentado (ver arriba)."""
+
+    @property
+    def _firestore_api(self):
+        return self._firestore_api_helper(_CountingGrpcTransport, firestore_sync_client.FirestoreClient,
+                                          firestore_sync_client)
+
+    def _emulator_channel(self, transport):
+        return grpc.intercept_channel(grpc.insecure_channel(self._emulator_host, options=_emulator_options(self)),
+                                      _SyncCounter())
+
+class AsyncClient(firestore.AsyncClient):
+    """firestore.AsyncClient con el canal gRPC aio instrumentado (ver arriba)."""
+
+    @property
+    def _firestore_api(self):
+        return self._firestore_api_helper(_CountingGrpcAsyncIOTransport,
+                                          firestore_async_client.FirestoreAsyncClient, firestore_async_client)
+
+    def _emulator_channel(self, transport):
+        return grpc.aio.insecure_channel(self._emulator_host, options=_emulator_options(self),
+                                         interceptors=_async_interceptors())
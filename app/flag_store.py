@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from starlette.concurrency import run_in_threadpool
+from . import metrics
+
+FLAGS_CACHE_TTL = float(os.getenv("FLAGS_CACHE_TTL", "60"))
+
+def index_key(key: str, scope: str | None, user_id: str | None = None) -> tuple[str, str]:
+    """(key, scope) del índice; los flags de usuario se indexan como scope "user:<uid>".
+
+    FlagIn exige userId con scope "user", pero documentos anteriores (p. ej. de la ingesta)
+    pueden no tenerlo: quedan como "user:", se listan en GET /flags y `evaluate` nunca los usa.
+    """
+    if scope == "user":
+        return (key, f"user:{user_id or ''}")
+    return (key, "global")
+
+class FlagStore:
+    """Copia en memoria de la colección `flags`: todos los documentos por ID y un índice
+    (key, scope) -> documentos. `create_flag` no impone keys únicas, así que una key puede
+    tener varios documentos; `evaluate` usa el de `updatedAt` más reciente.
+
+    Se carga una vez y se mantiene al día con un listener `on_snapshot`. Si el listener
+    se cae, los datos se consideran válidos durante FLAGS_CACHE_TTL segundos; pasado ese
+    tiempo la siguiente lectura recarga la colección y vuelve a suscribirse.
+    """
+
+    def __init__(self, to_dict, collection: str = "flags", ttl: float = FLAGS_CACHE_TTL):
+        self.to_dict = to_dict
+        self.collection = collection
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._flags: dict[str, dict] = {}
+        self._index: dict[tuple[str, str], dict[str, dict]] = {}
+        self._loaded_at = 0.0
+        self._watch = None
+
+    def _put(self, doc_id: str, flag: dict):
+        self._remove(doc_id)
+        self._flags[doc_id] = flag
+        k = index_key(flag.get("key"), flag.get("scope"), flag.get("userId"))
+        self._index.setdefault(k, {})[doc_id] = flag
+
+    def _remove(self, doc_id: str):
+        flag = self._flags.pop(doc_id, None)
+        if flag is None:
+            return
+        k = index_key(flag.get("key"), flag.get("scope"), flag.get("userId"))
+        docs = self._index.get(k, {})
+        docs.pop(doc_id, None)
+        if not docs:
+            self._index.pop(k, None)
+
+    def _winner(self, k: tuple[str, str]) -> dict | None:
+        docs = self._index.get(k)
+        if not docs:
+            return None
+        # updatedAt ya viene en ISO 8601 (UTC); en empate decide el ID para que sea estable
+        return max(docs.values(), key=lambda f: (f.get("updatedAt") or "", f.get("id") or ""))
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self._remove(change.document.id)
+                else:
+                    self._put(change.document.id, self.to_dict(change.document))
+            self._loaded_at = time.monotonic()
+        metrics.incr("flags.cache.listener_events")
+        metrics.set_gauge("flags.cache.size", len(self._flags))
+
+    def _listening(self) -> bool:
+        return self._watch is not None and self._watch.is_active
+
+    def fresh(self) -> bool:
+        return self._loaded_at > 0 and (self._listening() or time.monotonic() - self._loaded_at < self.ttl)
+
+    def refresh(self, get_db):
+        """Recarga completa (bloqueante) y (re)suscripción del listener. Usa el cliente sync."""
+        with self._refresh_lock:
+            if self.fresh():
+                return
+            col = get_db().collection(self.collection)
+            docs = list(col.stream())
+            with self._lock:
+                self._flags.clear()
+                self._index.clear()
+                for d in docs:
+                    self._put(d.id, self.to_dict(d))
+                self._loaded_at = time.monotonic()
+            metrics.incr("flags.cache.reloads")
+            metrics.set_gauge("flags.cache.size", len(self._flags))
+            if not self._listening():
+                if self._watch is not None:
+                    self._watch.unsubscribe()
+                self._watch = col.on_snapshot(self._on_snapshot)
+
+    async def ensure_fresh(self, get_db):
+        """Sirve desde memoria (hit) o recarga en el threadpool si expiró el TTL sin listener (miss)."""
+        if self.fresh():
+            metrics.incr("flags.cache.hit")
+            return
+        metrics.incr("flags.cache.miss")
+        await run_in_threadpool(self.refresh, get_db)
+
+    def items(self) -> list[dict]:
+        """Todos los documentos, en orden de ID como los devuelve Firestore."""
+        with self._lock:
+            return [self._flags[doc_id] for doc_id in sorted(self._flags)]
+
+    def evaluate(self, keys: list[str] | None, user_id: str | None) -> dict:
+        """Valor efectivo de cada key: el flag de usuario sobreescribe al global."""
+        with self._lock:
+            if keys is None:
+                keys = sorted({k for k, _ in self._index})
+            values, missing = {}, []
+            for key in keys:
+                flag = None
+                if user_id:
+                    flag = self._winner((key, f"user:{user_id}"))
+                if flag is None:
+                    flag = self._winner((key, "global"))
+                if flag is None:
+                    missing.append(key)
+                else:
+                    values[key] = flag.get("value")
+        return {"values": values, "missing": missing}
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from . import metrics
+
+class ConcurrencyLimiter:
+    """Limita las llamadas concurrentes a un backend lento con una cola de espera acotada.
+
+    Hasta `max_concurrency` llamadas en curso; las siguientes esperan en cola. Si ya hay
+    `max_queue` esperando, o la espera supera `queue_timeout` segundos, se responde 429 con
+    `Retry-After` en lugar de dejar la request colgada. Métricas bajo `<name>.*`:
+    gauges `inflight` y `queue.depth`, tiempo `queue.wait_ms` y contador `queue.rejected`.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int,
+                 queue_timeout: float, retry_after: int = 1):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._inflight = 0
+        self._waiting = 0
+
+    def _reject(self, reason: str) -> HTTPException:
+        metrics.incr(f"{self.name}.queue.rejected")
+        return HTTPException(status_code=429, detail=reason,
+                             headers={"Retry-After": str(self.retry_after)})
+
+    def check(self):
+        """429 inmediato si la cola está llena (para rechazar antes de abrir un stream)."""
+        if self._inflight + self._waiting >= self.max_concurrency + self.max_queue:
+            raise self._reject("queue_full")
+
+    async def acquire(self):
+        self.check()
+        if self._inflight < self.max_concurrency and not self._waiting:
+            # Hay slot libre: se toma sin pasar por la cola
+            await self._sem.acquire()
+            self._inflight += 1
+            metrics.set_gauge(f"{self.name}.inflight", self._inflight)
+            metrics.observe_ms(f"{self.name}.queue.wait_ms", 0.0)
+            return
+        self._waiting += 1
+        metrics.set_gauge(f"{self.name}.queue.depth", self._waiting)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout")
+        finally:
+            self._waiting -= 1
+            metrics.set_gauge(f"{self.name}.queue.depth", self._waiting)
+            metrics.observe_ms(f"{self.name}.queue.wait_ms", (time.perf_counter() - t0) * 1000)
+        self._inflight += 1
+        metrics.set_gauge(f"{self.name}.inflight", self._inflight)
+
+    def release(self):
+        self._inflight -= 1
+        metrics.set_gauge(f"{self.name}.inflight", self._inflight)
+        self._sem.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
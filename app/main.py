@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
@@ -10,17 +11,42 @@ from .routers.objects import router as objects_router
 from .routers.flags import router as flags_router
 from .routers.secrets import router as secrets_router
 from .routers.ai import router as prompts_router
+from .routers.translate import router as translate_router
 from .routers.auth import router as auth_router
-app = FastAPI(title="TralioGo API", version="1.0.0")
+from . import metrics
+from .clients import clients, CLIENTS_WARMUP
+from .deps import get_async_db
+from .translation_memory import memory, TM_WARMUP
+from .serializers import FastJSONResponse
+app = FastAPI(title="TralioGo API", version="1.0.0", default_response_class=FastJSONResponse)
+app.add_middleware(metrics.RpcCountMiddleware)
+
+_warmup = None
+
+@app.on_event("startup")
+async def warm_clients():
+    # Vertex y Firebase Admin se construyen en el threadpool después de arrancar: /healthz
+    # responde de inmediato y la primera request de datos ya no paga el import de los SDKs
+    global _warmup
+    if CLIENTS_WARMUP:
+        _warmup = asyncio.create_task(clients.warm(CLIENTS_WARMUP))
+    if TM_WARMUP:
+        # La memoria de traducciones se carga en segundo plano (ver app/translation_memory.py)
+        memory.warm(get_async_db)
 
 @app.get("/healthz", response_class=PlainTextResponse)
 def healthz():
     return "ok"
 
+@app.get("/metrics")
+async def get_metrics():
+    return metrics.snapshot()
+
 app.include_router(history_router, prefix="/api/v1/history", tags=["history"])
 app.include_router(users_router, prefix="/api/v1/users", tags=["users"])
 app.include_router(objects_router, prefix="/api/v1/objects", tags=["objects"])
 app.include_router(flags_router, prefix="/api/v1/flags", tags=["flags"])
 app.include_router(secrets_router)
 app.include_router(prompts_router)
+app.include_router(translate_router)
 app.include_router(auth_router, prefix="/api/v1", tags=["auth"])
\ No newline at end of file
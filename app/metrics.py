@@ -0,0 +1,71 @@
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+
+# Métricas en proceso (contadores y tiempos), expuestas en GET /metrics.
+_lock = threading.Lock()
+_counters: dict[str, int] = defaultdict(int)
+_timings: dict[str, list] = {}  # nombre -> [count, total_ms, max_ms]
+_gauges: dict[str, float] = {}
+
+# RPCs a Firestore hechos por la request en curso (lista mutable compartida con subtareas)
+_request_rpcs: ContextVar[list | None] = ContextVar("firestore_request_rpcs", default=None)
+
+def incr(name: str, n: int = 1):
+    with _lock:
+        _counters[name] += n
+
+def observe_ms(name: str, ms: float):
+    with _lock:
+        t = _timings.get(name)
+        if t is None:
+            _timings[name] = [1, ms, ms]
+        else:
+            t[0] += 1
+            t[1] += ms
+            t[2] = max(t[2], ms)
+
+def set_gauge(name: str, value: float):
+    _gauges[name] = value
+
+def record_rpc(kind: str):
+    """Cuenta un round trip a Firestore, global y para la request actual.
+
+    Lo llaman los interceptores gRPC de app/firestore_rpc.py, no los handlers."""
+    incr(f"firestore.rpc.{kind}")
+    current = _request_rpcs.get()
+    if current is not None:
+        current[0] += 1
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {k: {"count": c, "avg_ms": round(total / c, 3), "max_ms": round(mx, 3)}
+                        for k, (c, total, mx) in _timings.items()},
+        }
+
+class RpcCountMiddleware:
+    """Middleware ASGI que agrega `X-Firestore-RPCs` con los round trips hechos por la request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rpcs = [0]
+        token = _request_rpcs.set(rpcs)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-firestore-rpcs", str(rpcs[0]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _request_rpcs.reset(token)
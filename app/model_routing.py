@@ -0,0 +1,98 @@
+import math
+import os
+import threading
+from collections import deque
+from . import metrics
+from .vertex import MODEL_NAME
+
+# Tabla de rutas: "modelo:max_chars,modelo:max_chars,modelo" del más rápido al más capaz.
+# El último puede ir sin límite. Sin configurar se usa solo VERTEX_MODEL.
+VERTEX_ROUTES = os.getenv("VERTEX_ROUTES", "")
+VERTEX_FALLBACK_MODEL = os.getenv("VERTEX_FALLBACK_MODEL", "")
+VERTEX_ROUTE_TIMEOUT = float(os.getenv("VERTEX_ROUTE_TIMEOUT", "20"))  # segundos
+ROUTING_WINDOW = int(os.getenv("ROUTING_WINDOW", "200"))  # latencias recientes por modelo
+ROUTING_MIN_SAMPLES = 20  # por debajo, el p95 de un modelo no se usa para descartarlo
+
+def parse_routes(spec: str, default_model: str) -> list[tuple[str, int | None]]:
+    routes = []
+    for part in (p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        name, _, limit = part.partition(":")
+        routes.append((name.strip(), int(limit) if limit else None))
+    return routes or [(default_model, None)]
+
+class ModelRouter:
+    """Elige el modelo de cada prompt según su longitud, la latencia máxima pedida y el p95
+    reciente de cada modelo (ventana de ROUTING_WINDOW llamadas).
+
+    Las decisiones (`routing.decision.<modelo>.<motivo>`) y los resultados
+    (`routing.outcome.<modelo>.<ok|timeout|error>`) quedan en metrics; `table()` expone el
+    estado actual para ajustar VERTEX_ROUTES con datos.
+    """
+
+    def __init__(self, routes: list[tuple[str, int | None]], fallback: str | None,
+                 timeout: float, window: int = ROUTING_WINDOW):
+        self.routes = routes
+        self.fallback = fallback or None
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._latencies: dict[str, deque] = {}
+        self._window = window
+
+    def p95(self, model: str) -> float | None:
+        with self._lock:
+            samples = self._latencies.get(model)
+            if not samples or len(samples) < ROUTING_MIN_SAMPLES:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def choose(self, prompt: str, override: str | None = None, max_latency_ms: int | None = None) -> dict:
+        """Ruta de un prompt: model, reason (override, length, latency, p95_min o default),
+        timeout en segundos y fallback (modelo secundario si el principal excede el timeout)."""
+        timeout = min(self.timeout, max_latency_ms / 1000) if max_latency_ms else self.timeout
+        if override:
+            route = {"model": override, "reason": "override", "timeout": timeout, "fallback": None}
+        else:
+            # Modelos que admiten la longitud del prompt, en el orden de la tabla
+            fits = [m for m, limit in self.routes if limit is None or len(prompt) <= limit] or [self.routes[-1][0]]
+            route = {"model": fits[0], "reason": "length" if len(fits) < len(self.routes) else "default",
+                     "timeout": timeout, "fallback": None}
+            if max_latency_ms:
+                p95s = {m: self.p95(m) for m in fits}
+                fast = [m for m in fits if p95s[m] is None or p95s[m] <= max_latency_ms]
+                if fast:
+                    route.update(model=fast[0], reason="latency")
+                else:
+                    route.update(model=min(fits, key=lambda m: p95s[m]), reason="p95_min")
+            if self.fallback and self.fallback != route["model"]:
+                route["fallback"] = self.fallback
+        metrics.incr(f"routing.decision.{route['model']}.{route['reason']}")
+        return route
+
+    def record(self, model: str, outcome: str, latency_ms: float | None = None):
+        """Resultado de una llamada. Un timeout se registra con latencia infinita: la llamada
+        no terminó dentro del presupuesto, así que su p95 tiene que quedar por encima de él."""
+        metrics.incr(f"routing.outcome.{model}.{outcome}")
+        if latency_ms is not None:
+            with self._lock:
+                self._latencies.setdefault(model, deque(maxlen=self._window)).append(latency_ms)
+
+    def table(self) -> dict:
+        models = dict.fromkeys([m for m, _ in self.routes] + ([self.fallback] if self.fallback else []))
+        with self._lock:
+            counts = {m: len(self._latencies.get(m, ())) for m in models}
+            timeouts = {m: sum(1 for x in self._latencies.get(m, ()) if math.isinf(x)) for m in models}
+        p95s = {m: self.p95(m) for m in models}
+        return {
+            "routes": [{"model": m, "maxChars": limit} for m, limit in self.routes],
+            "fallback": self.fallback,
+            "timeoutSeconds": self.timeout,
+            # p95Ms es null sin muestras suficientes o si más del 5% de la ventana fue timeout
+            "models": {m: {"samples": counts[m], "timeouts": timeouts[m],
+                           "p95Ms": p95s[m] if p95s[m] is None or math.isfinite(p95s[m]) else None}
+                       for m in models},
+        }
+
+model_router = ModelRouter(parse_routes(VERTEX_ROUTES, MODEL_NAME), VERTEX_FALLBACK_MODEL, VERTEX_ROUTE_TIMEOUT)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, model_validator
 from typing import Optional, List, Literal, Union
 
 class HistoryIn(BaseModel):
@@ -13,6 +13,7 @@ class HistoryIn(BaseModel):
 
 class HistoryOut(HistoryIn):
     id: str
+    updateTime: Optional[datetime] = None  # última escritura en Firestore
 
 class UserIn(BaseModel):
     email: EmailStr
@@ -23,6 +24,7 @@ class UserIn(BaseModel):
 
 class UserOut(UserIn):
     id: str
+    updateTime: Optional[datetime] = None  # última escritura en Firestore
 
 class ObjectIn(BaseModel):
     label: str
@@ -35,13 +37,30 @@ class ObjectIn(BaseModel):
 
 class ObjectOut(ObjectIn):
     id: str
+    updateTime: Optional[datetime] = None  # última escritura en Firestore
 
 class FlagIn(BaseModel):
     key: str
     value: Union[str, bool, float, int, dict, list, None] = None
     type: Optional[Literal["bool", "str", "num", "json"]] = None
     scope: Optional[Literal["global", "user"]] = "global"
+    userId: Optional[str] = None  # requerido para scope="user"
     updatedAt: Optional[datetime] = None
 
+    @model_validator(mode="after")
+    def _user_scope_requires_user_id(self):
+        # Un flag de usuario sin userId nunca lo resolvería :evaluate
+        if self.scope == "user" and not self.userId:
+            raise ValueError("userId is required when scope is 'user'")
+        return self
+
 class FlagOut(FlagIn):
     id: str
+    updateTime: Optional[datetime] = None  # última escritura en Firestore
+
+class FlagEvalIn(BaseModel):
+    userId: Optional[str] = None
+    keys: Optional[List[str]] = None  # None = todos los flags conocidos
+
+class BatchCreateIn(BaseModel):
+    items: List[dict]  # cada item se valida con el modelo *In de la colección
@@ -0,0 +1,76 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from google.cloud.firestore_v1 import Query
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Orden estable para keyset pagination: ts descendente y, en empates, el ID del doc.
+# Coincide con los índices compuestos de firestore.indexes.json (Firestore agrega
+# __name__ implícitamente en la misma dirección que el último campo).
+TS_ORDER = (("ts", Query.DESCENDING), (FieldPath.document_id(), Query.DESCENDING))
+
+def encode_cursor(doc) -> str | None:
+    """Cursor opaco (base64 url-safe) con el ts y el ID del último documento de la página.
+
+    `ts` suele ser un timestamp, pero un PUT o la ingesta pueden dejar un string o un número;
+    el cursor guarda el tipo (`k`: t, s o n) para que start_after() reciba el mismo valor.
+    """
+    ts = (doc.to_dict() or {}).get("ts")
+    if isinstance(ts, datetime):
+        data = {"ts": ts.isoformat()}
+    elif isinstance(ts, str):
+        data = {"ts": ts, "k": "s"}
+    elif isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        data = {"ts": ts, "k": "n"}
+    else:
+        return None
+    raw = json.dumps({**data, "id": doc.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode_ts(data: dict):
+    kind, ts = data.get("k", "t"), data["ts"]
+    if kind == "t":
+        return datetime.fromisoformat(ts)
+    if kind == "s" and isinstance(ts, str):
+        return ts
+    if kind == "n" and isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        return ts
+    raise ValueError(kind)
+
+def decode_cursor(cursor: str) -> dict:
+    """Devuelve los valores para start_after() o lanza 400 si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        doc_id = data["id"]
+        # Un id con "/" o vacío no es un documento de la colección; Firestore fallaría en stream()
+        if not isinstance(doc_id, str) or not doc_id or "/" in doc_id:
+            raise ValueError(doc_id)
+        return {"ts": _decode_ts(data), "__name__": doc_id}
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid_cursor")
+
+def by_ts(q):
+    for field, direction in TS_ORDER:
+        q = q.order_by(field, direction=direction)
+    return q
+
+def ordered_by_ts(q, cursor: str | None, limit: int, fields: list[str] | None = None):
+    """Aplica el orden por ts, el cursor y un límite de limit+1 para saber si hay otra página.
+
+    Con `fields` proyecta con select(); `ts` se lee siempre porque forma parte del cursor.
+    """
+    if fields is not None:
+        q = q.select(list(dict.fromkeys([*fields, "ts"])))
+    q = by_ts(q)
+    if cursor:
+        q = q.start_after(decode_cursor(cursor))
+    return q.limit(limit + 1)
+
+def page(docs: list, limit: int):
+    """Recorta la página y calcula next_cursor a partir del último documento devuelto."""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from . import metrics
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1000"))
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", "86400"))  # segundos
+COL = "prompt_cache"
+
+def cache_key(model: str, prompt: str, generation_config: dict) -> str:
+    raw = json.dumps([model, prompt, generation_config], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class PromptCache:
+    """Caché exacta de respuestas de Vertex por hash de (model, prompt, generation_config).
+
+    Dos niveles: un LRU en memoria (tamaño PROMPT_CACHE_SIZE, TTL PROMPT_CACHE_TTL) y la
+    colección `prompt_cache` en Firestore, compartida entre instancias. Un hit en Firestore
+    se promueve a memoria. Los contadores por modelo quedan en metrics (prompt_cache.*).
+    """
+
+    def __init__(self, max_size: int = PROMPT_CACHE_SIZE, ttl: int = PROMPT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def _remember(self, key: str, output: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, output)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    async def get(self, db, key: str, model: str) -> tuple[str | None, str | None]:
+        """Devuelve (output, nivel) con nivel "memory" o "firestore"; (None, None) si no hay."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                else:
+                    del self._memory[key]
+                    entry = None
+        if entry is not None:
+            metrics.incr(f"prompt_cache.hit.memory.{model}")
+            return entry[1], "memory"
+
+        snap = await db.collection(COL).document(key).get()
+        data = snap.to_dict() if snap.exists else None
+        if data and data.get("expiresAt") and data["expiresAt"].timestamp() > now:
+            self._remember(key, data["output"], data["expiresAt"].timestamp())
+            metrics.incr(f"prompt_cache.hit.firestore.{model}")
+            return data["output"], "firestore"
+        metrics.incr(f"prompt_cache.miss.{model}")
+        return None, None
+
+    async def put(self, db, key: str, model: str, prompt: str, output: str):
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        self._remember(key, output, expires_at.timestamp())
+        # expiresAt sirve también como campo de TTL policy de Firestore
+        await db.collection(COL).document(key).set({
+            "model": model, "prompt": prompt, "output": output,
+            "createdAt": now, "expiresAt": expires_at,
+        })
+
+prompt_cache = PromptCache()
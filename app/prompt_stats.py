@@ -0,0 +1,140 @@
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from google.api_core import exceptions as gexc
+from google.cloud import firestore
+from . import metrics
+
+COL = "prompt_stats"
+PROMPT_STATS_SHARDS = max(int(os.getenv("PROMPT_STATS_SHARDS", "8")), 1)
+
+# Acumulados por día y modelo de las llamadas de /prompts. Cada alta en `prompts` suma
+# a un shard `prompt_stats/<día>_<modelo>_<n>` (n al azar entre 0 y PROMPT_STATS_SHARDS-1)
+# con transforms Increment/Maximum en el mismo commit: las escrituras de un mismo día y modelo
+# se reparten entre N documentos en lugar de competir por uno. GET /prompts/stats suma los
+# shards, así lee unos pocos documentos en lugar de escanear `prompts`.
+
+_COUNTERS = ("calls", "upstreamCalls", "cacheHits", "coalesced",
+             "inputTokens", "outputTokens", "totalTokens", "latencyMsTotal")
+
+def usage_of(response) -> dict:
+    """Tokens de `usage_metadata` de una respuesta de Vertex (0 si no vienen)."""
+    u = getattr(response, "usage_metadata", None)
+    return {
+        "inputTokens": getattr(u, "prompt_token_count", 0) or 0,
+        "outputTokens": getattr(u, "candidates_token_count", 0) or 0,
+        "totalTokens": getattr(u, "total_token_count", 0) or 0,
+    }
+
+def account(model_name: str, call: dict, kind: str = "prompts"):
+    """Métricas en proceso de una llamada (latencia y tokens por modelo)."""
+    metrics.observe_ms(f"{kind}.latency_ms.{model_name}", call["latencyMs"])
+    if call["cacheStatus"] == "miss":
+        metrics.incr(f"vertex.tokens.input.{model_name}", call["usage"]["inputTokens"])
+        metrics.incr(f"vertex.tokens.output.{model_name}", call["usage"]["outputTokens"])
+
+def stats_id(day: str, model: str, shard: int) -> str:
+    return f"{day}_{model.replace('/', '_')}_{shard}"
+
+def rollups(docs: list[dict]) -> dict[str, dict]:
+    """Agrupa documentos de `prompts` por (día, modelo) y arma el merge de cada acumulado,
+    cada grupo en un shard al azar."""
+    groups: dict[tuple[str, str], dict] = {}
+    for d in docs:
+        day = d["ts"].strftime("%Y-%m-%d")
+        g = groups.setdefault((day, d["model"]),
+                              {"day": day, "model": d["model"], "latencyMsMax": 0.0,
+                               **{k: 0 for k in _COUNTERS}})
+        status = d["cacheStatus"]
+        g["calls"] += 1
+        g["upstreamCalls"] += status == "miss"
+        g["cacheHits"] += status in ("memory", "firestore")
+        g["coalesced"] += status == "coalesced"
+        if status == "miss":
+            # Solo las llamadas upstream consumen tokens
+            for k, v in d["usage"].items():
+                g[k] += v
+        g["latencyMsTotal"] += d["latencyMs"]
+        g["latencyMsMax"] = max(g["latencyMsMax"], d["latencyMs"])
+    return {
+        stats_id(day, model, random.randrange(PROMPT_STATS_SHARDS)):
+            {"day": g["day"], "model": g["model"],
+             **{k: firestore.Increment(g[k]) for k in _COUNTERS},
+             "latencyMsMax": firestore.Maximum(g["latencyMsMax"])}
+        for (day, model), g in groups.items()
+    }
+
+async def create_with_rollups(db, col_ref, docs: list[dict]) -> list[tuple]:
+    """Crea `docs` en `col_ref` y actualiza sus acumulados en un único WriteBatch.
+
+    Si Firestore rechaza el commit por contención en los acumulados (ABORTED /
+    RESOURCE_EXHAUSTED, el commit no se aplicó) los documentos se crean solos y los acumulados
+    se reintentan una vez aparte, en otros shards; si ese intento también falla se pierden
+    (`prompt_stats.rollup_failed`), no el registro de `prompts`.
+
+    Devuelve (ref, write_result) por documento, en orden.
+    """
+    refs = [col_ref.document() for _ in docs]
+    stats = db.collection(COL)
+    batch = db.batch()
+    for ref, d in zip(refs, docs):
+        batch.create(ref, d)
+    for doc_id, data in rollups(docs).items():
+        batch.set(stats.document(doc_id), data, merge=True)
+    try:
+        write_results = await batch.commit()
+    except (gexc.Aborted, gexc.ResourceExhausted):
+        metrics.incr("prompt_stats.contention")
+        batch = db.batch()
+        for ref, d in zip(refs, docs):
+            batch.create(ref, d)
+        write_results = await batch.commit()
+        batch = db.batch()
+        for doc_id, data in rollups(docs).items():
+            batch.set(stats.document(doc_id), data, merge=True)
+        try:
+            await batch.commit()
+        except gexc.GoogleAPICallError:
+            metrics.incr("prompt_stats.rollup_failed")
+    return list(zip(refs, write_results))
+
+async def record_rollups(db, docs: list[dict]):
+    """Suma `docs` a sus acumulados sin crear documentos: llamadas al modelo que no se guardan
+    en `prompts` (p. ej. /translate). Un fallo solo se cuenta en `prompt_stats.rollup_failed`."""
+    batch = db.batch()
+    stats = db.collection(COL)
+    for doc_id, data in rollups(docs).items():
+        batch.set(stats.document(doc_id), data, merge=True)
+    try:
+        await batch.commit()
+    except gexc.GoogleAPICallError:
+        metrics.incr("prompt_stats.rollup_failed")
+
+def _summary(d: dict) -> dict:
+    calls = d.get("calls") or 0
+    return {
+        **d,
+        "avgLatencyMs": round(d.get("latencyMsTotal", 0) / calls, 3) if calls else None,
+        "cacheHitRate": round(d.get("cacheHits", 0) / calls, 4) if calls else None,
+    }
+
+async def read_stats(db, days: int, model: str | None = None) -> list[dict]:
+    """Acumulados de los últimos `days` días (índice model+day si se filtra por modelo).
+
+    Suma los shards de cada (día, modelo); `latencyMsMax` es el máximo entre ellos.
+    """
+    since = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    q = db.collection(COL)
+    if model:
+        q = q.where("model", "==", model)
+    q = q.where("day", ">=", since).order_by("day", direction="DESCENDING")
+    totals: dict[tuple[str, str], dict] = {}
+    async for snap in q.stream():
+        d = snap.to_dict()
+        t = totals.setdefault((d["day"], d["model"]),
+                              {"day": d["day"], "model": d["model"], "latencyMsMax": 0.0,
+                               **{k: 0 for k in _COUNTERS}})
+        for k in _COUNTERS:
+            t[k] += d.get(k) or 0
+        t["latencyMsMax"] = max(t["latencyMsMax"], d.get("latencyMsMax") or 0.0)
+    return [_summary(t) for t in totals.values()]
@@ -1,98 +1,323 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+import asyncio
+import json
+import os
+import time
+from fastapi import APIRouter, HTTPException, Query, Depends, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timezone
-import os
-from dotenv import load_dotenv
-from google.cloud import aiplatform
-from vertexai import init as vertex_init
-from vertexai.generative_models import GenerativeModel
 
-from ..deps import get_db, auth_dependency  # tu firestore (firebase-admin) inicializado en app/main.py
+from google.cloud import firestore
+from ..deps import get_async_db, auth_dependency  # tu firestore (firebase-admin) inicializado en app/main.py
+from ..vertex import registry, limiter, vertex_error
+from ..store import MAX_BATCH, get_doc, update_doc, delete_doc, etag_of, not_modified
+from ..serializers import FastJSONResponse
+from .. import metrics
+from ..prompt_cache import prompt_cache, cache_key
+from ..singleflight import SingleFlight
+from ..prompt_stats import usage_of, account, create_with_rollups, read_stats
+from ..model_routing import model_router
 
-load_dotenv()
 router = APIRouter(prefix="/api/v1/prompts", tags=["ai-prompts"])
 
-PROJECT_ID = os.getenv("GCLOUD_PROJECT")
-LOCATION = os.getenv("VERTEX_LOCATION", "us-central1")
-MODEL_NAME = os.getenv("VERTEX_MODEL", "")
-
 class PromptIn(BaseModel):
     prompt: str = Field(..., description="Texto a enviar al modelo")
     model: Optional[str] = Field(None, description="Override del modelo")
+    cache: bool = Field(True, description="Usar la caché de respuestas (false para forzar una llamada al modelo)")
+    maxLatencyMs: Optional[int] = Field(None, ge=1, description="Latencia máxima aceptable; orienta la elección del modelo")
+
+class PromptBatchIn(BaseModel):
+    items: List[PromptIn] = Field(..., description="Prompts a ejecutar; la respuesta respeta el orden")
 
 class PromptUpdate(BaseModel):
     note: Optional[str] = None
 
+# Un solo WriteBatch: los prompts más, como mucho, un acumulado de prompt_stats por prompt
+PROMPT_BATCH_MAX_ITEMS = min(int(os.getenv("PROMPT_BATCH_MAX_ITEMS", "200")), MAX_BATCH // 2)
+PROMPT_BATCH_PARALLELISM = int(os.getenv("PROMPT_BATCH_PARALLELISM", "16"))
+
 COL = "prompts"
-def col(): return get_db().collection(COL)
+def col(db): return db.collection(COL)
 
-def vertex():
-    aiplatform.init(project=PROJECT_ID, location=LOCATION)
-    vertex_init(project=PROJECT_ID, location=LOCATION)
-    model = GenerativeModel(MODEL_NAME)
-    return model
+# Configuración económica; forma parte de la clave de la caché de respuestas
+GENERATION_CONFIG = {
+    'max_output_tokens': 500,  # Limitar tokens para ser económico
+    'temperature': 0.7
+}
 
-@router.post("", status_code=201)
-def create_prompt(body: PromptIn, user=Depends(auth_dependency)):
+# Prompts idénticos en curso comparten una sola llamada a Vertex
+inflight = SingleFlight("prompts.singleflight")
+
+async def call_model(name: str, prompt: str, timeout: float) -> dict:
+    # Modelo reutilizado del registro (Vertex se inicializa una vez por proceso)
+    model = await registry.aget(name)
+    t0 = time.perf_counter()
     try:
-        # Inicializar si es necesario
-        aiplatform.init(project=PROJECT_ID, location=LOCATION)
-        vertex_init(project=PROJECT_ID, location=LOCATION)
-        
-        model = GenerativeModel(body.model or MODEL_NAME)
-        
-        # Generar contenido con configuración económica
-        response = model.generate_content(
-            body.prompt,
-            generation_config={
-                'max_output_tokens': 500,  # Limitar tokens para ser económico
-                'temperature': 0.7
-            }
-        )
-        output = response.text
-        
-    except Exception as e:
-        error_msg = str(e)
-        if "403" in error_msg and "permission" in error_msg.lower():
-            raise HTTPException(503, "Vertex AI permissions are still propagating. Please try again in a few minutes.")
-        elif "quota" in error_msg.lower():
-            raise HTTPException(429, "Vertex AI quota exceeded. Please try again later.")
-        else:
-            raise HTTPException(400, f"Vertex AI error: {error_msg}")
+        response = await asyncio.wait_for(
+            model.generate_content_async(prompt, generation_config=GENERATION_CONFIG), timeout)
+    except asyncio.TimeoutError:
+        # El timeout cuenta como muestra de latencia infinita: no terminó dentro del presupuesto
+        model_router.record(name, "timeout", float("inf"))
+        raise
+    except Exception:
+        model_router.record(name, "error")
+        raise
+    model_router.record(name, "ok", (time.perf_counter() - t0) * 1000)
+    return {"model": name, "output": response.text, "usage": usage_of(response)}
+
+async def generate(body: PromptIn, route: dict) -> dict:
+    """Una llamada a Vertex con `generate_content_async`, dentro del limitador de concurrencia.
 
-    doc = {
+    Si el modelo elegido excede el timeout de la ruta se reintenta una vez con el modelo de
+    fallback. Devuelve `model` (el que respondió), `output`, `usage` y `fallbackUsed`.
+    """
+    async with limiter.slot():
+        try:
+            try:
+                return {**await call_model(route["model"], body.prompt, route["timeout"]), "fallbackUsed": False}
+            except asyncio.TimeoutError:
+                if not route["fallback"]:
+                    raise
+                metrics.incr(f"routing.fallback.{route['model']}")
+                result = await call_model(route["fallback"], body.prompt, model_router.timeout)
+                return {**result, "fallbackUsed": True}
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Vertex AI timeout")
+        except Exception as e:
+            raise vertex_error(e)
+
+async def run_prompt(db, body: PromptIn) -> dict:
+    """Caché de respuestas y, si no hay hit, una llamada a Vertex compartida con los prompts
+    idénticos en curso, al modelo que elija el router (longitud, maxLatencyMs, p95).
+
+    Devuelve model, output, cacheTier, cacheStatus ("memory", "firestore", "miss" o
+    "coalesced"), usage, latencyMs y routing.
+    """
+    t0 = time.perf_counter()
+    route = model_router.choose(body.prompt, body.model, body.maxLatencyMs)
+    model_name = route["model"]
+    key = cache_key(model_name, body.prompt, GENERATION_CONFIG)
+    output, tier = await prompt_cache.get(db, key, model_name) if body.cache else (None, None)
+    usage = {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0}
+    status = tier
+    fallback_used = False
+
+    if output is None:
+        upstream = False
+
+        async def generate_and_cache():
+            nonlocal upstream
+            upstream = True  # solo corre en la request que hace la llamada
+            result = await generate(body, route)
+            if body.cache:
+                # Con fallback la respuesta es de otro modelo: se guarda bajo la clave de ese modelo
+                answered_by = result["model"]
+                await prompt_cache.put(db, cache_key(answered_by, body.prompt, GENERATION_CONFIG),
+                                       answered_by, body.prompt, result["output"])
+            return result
+        result = await inflight.do(key, generate_and_cache)
+        output, usage, fallback_used = result["output"], result["usage"], result["fallbackUsed"]
+        model_name = result["model"]
+        status = "miss" if upstream else "coalesced"
+
+    call = {"model": model_name, "output": output, "cacheTier": tier, "cacheStatus": status,
+            "usage": usage, "latencyMs": round((time.perf_counter() - t0) * 1000, 3),
+            "routing": {"model": route["model"], "reason": route["reason"], "fallbackUsed": fallback_used}}
+    account(model_name, call)
+    return call
+
+def prompt_doc(body: PromptIn, call: dict, user) -> dict:
+    return {
         "prompt": body.prompt,
-        "model": body.model or MODEL_NAME,
-        "output": output,
+        "model": call["model"],
+        "output": call["output"],
+        "cached": call["cacheTier"] is not None,
+        "cacheStatus": call["cacheStatus"],
+        "usage": call["usage"],
+        "latencyMs": call["latencyMs"],
+        "routing": call["routing"],
+        "userId": (user or {}).get("uid"),
         "ts": datetime.now(timezone.utc)
     }
-    ref = col().add(doc)[1]  # (ref, write_result) -> usamos ref
-    return {"id": ref.id, **doc}
+
+@router.post("", status_code=201)
+async def create_prompt(body: PromptIn, user=Depends(auth_dependency),
+                        db: firestore.AsyncClient = Depends(get_async_db)):
+    call = await run_prompt(db, body)
+    doc = prompt_doc(body, call, user)
+    # El documento y su acumulado diario en prompt_stats van en el mismo commit
+    try:
+        [(ref, wr)] = await create_with_rollups(db, col(db), [doc])
+    except Exception as e:
+        raise HTTPException(503, f"Firestore error: {e}")
+    return {**doc, "id": ref.id, "updateTime": wr.update_time, "cacheTier": call["cacheTier"]}
+
+@router.post(":batch")
+async def batch_prompts(body: PromptBatchIn, user=Depends(auth_dependency),
+                        db: firestore.AsyncClient = Depends(get_async_db)):
+    """Ejecuta los prompts en paralelo (hasta PROMPT_BATCH_PARALLELISM a la vez) y guarda los
+    resultados, con sus acumulados, en un único WriteBatch. Devuelve el resultado por item en
+    el orden recibido: el documento creado o `error` con `status` y `detail`.
+    """
+    if len(body.items) > PROMPT_BATCH_MAX_ITEMS:
+        raise HTTPException(400, f"too_many_items (max {PROMPT_BATCH_MAX_ITEMS})")
+    sem = asyncio.Semaphore(PROMPT_BATCH_PARALLELISM)
+
+    async def one(item: PromptIn):
+        async with sem:
+            try:
+                return await run_prompt(db, item)
+            except HTTPException as e:
+                return {"error": {"status": e.status_code, "detail": e.detail}}
+            except Exception as e:
+                # p. ej. Firestore en la caché de respuestas: falla este item, no el batch
+                return {"error": {"status": 503, "detail": f"{type(e).__name__}: {e}"}}
+
+    outcomes = await asyncio.gather(*[one(item) for item in body.items])
+
+    results: list[dict] = []
+    pending = []
+    for i, (item, outcome) in enumerate(zip(body.items, outcomes)):
+        if "error" in outcome:
+            results.append({"index": i, **outcome})
+            continue
+        doc = prompt_doc(item, outcome, user)
+        pending.append((i, doc))
+        results.append({"index": i, **doc, "cacheTier": outcome["cacheTier"]})
+
+    if pending:
+        try:
+            written = await create_with_rollups(db, col(db), [doc for _, doc in pending])
+        except Exception as e:
+            for i, _ in pending:
+                results[i] = {"index": i, "error": {"status": 503, "detail": f"Firestore error: {e}"}}
+        else:
+            for (i, _), (ref, wr) in zip(pending, written):
+                results[i].update(id=ref.id, updateTime=wr.update_time)
+
+    failed = sum(1 for r in results if "error" in r)
+    return {"items": results, "created": len(results) - failed, "failed": failed}
+
+def sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def chunk_text(chunk) -> str:
+    """Texto de un chunk del stream desde sus parts. `chunk.text` lanza ValueError si el chunk
+    no trae parts (bloqueo de seguridad, chunk final solo con metadata); aquí es "" y se omite."""
+    candidates = getattr(chunk, "candidates", None)
+    if not candidates:
+        return ""
+    parts = getattr(getattr(candidates[0], "content", None), "parts", None) or []
+    return "".join(getattr(p, "text", "") or "" for p in parts)
+
+async def stream_events(db, body: PromptIn, route: dict, key: str, user):
+    """Eventos SSE: `data` por cada chunk de texto y al final `done` con el id persistido.
+
+    El documento de `prompts` se guarda con el texto completo una vez terminado el stream;
+    si Vertex falla a mitad se emite `error` y no se persiste nada. Si falla el guardado (caché
+    o Firestore) también se emite `error`, en lugar de cortar la conexión.
+    """
+    t0 = time.perf_counter()
+    model_name = route["model"]
+    output, tier = await prompt_cache.get(db, key, model_name) if body.cache else (None, None)
+    usage = {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0}
+    if output is not None:
+        yield sse({"text": output})
+    else:
+        parts = []
+        try:
+            # El slot del limitador se mantiene mientras dura el stream
+            async with limiter.slot():
+                model = await registry.aget(model_name)
+                response = await model.generate_content_async(body.prompt, generation_config=GENERATION_CONFIG,
+                                                              stream=True)
+                async for chunk in response:
+                    if getattr(chunk, "usage_metadata", None):
+                        usage = usage_of(chunk)  # el último chunk trae el total
+                    text = chunk_text(chunk)
+                    if text:
+                        parts.append(text)
+                        yield sse({"text": text})
+        except HTTPException as e:
+            yield sse({"status": e.status_code, "detail": e.detail}, event="error")
+            return
+        except Exception as e:
+            model_router.record(model_name, "error")
+            err = vertex_error(e)
+            yield sse({"status": err.status_code, "detail": err.detail}, event="error")
+            return
+        # La duración de un stream no es comparable con la de una llamada: sin muestra de latencia
+        model_router.record(model_name, "ok")
+        output = "".join(parts)
+
+    call = {"model": model_name, "output": output, "cacheTier": tier, "cacheStatus": tier or "miss",
+            "usage": usage, "latencyMs": round((time.perf_counter() - t0) * 1000, 3),
+            "routing": {"model": model_name, "reason": route["reason"], "fallbackUsed": False}}
+    account(model_name, call)
+    try:
+        # Una respuesta vacía (p. ej. bloqueada por seguridad) no se cachea
+        if body.cache and tier is None and output:
+            await prompt_cache.put(db, key, model_name, body.prompt, output)
+        [(ref, _)] = await create_with_rollups(db, col(db), [prompt_doc(body, call, user)])
+    except Exception as e:
+        yield sse({"status": 503, "detail": f"Firestore error: {e}"}, event="error")
+        return
+    yield sse({"id": ref.id, "model": model_name, "cached": tier is not None, "cacheTier": tier,
+               "usage": usage, "latencyMs": call["latencyMs"]}, event="done")
+
+@router.post(":stream")
+async def stream_prompt(body: PromptIn, user=Depends(auth_dependency),
+                        db: firestore.AsyncClient = Depends(get_async_db)):
+    route = model_router.choose(body.prompt, body.model, body.maxLatencyMs)
+    key = cache_key(route["model"], body.prompt, GENERATION_CONFIG)
+    # Con la cola llena se responde 429 antes de abrir el stream
+    limiter.check()
+    return StreamingResponse(stream_events(db, body, route, key, user), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("")
-def list_prompts(limit: int = Query(10, ge=1, le=100)):
+async def list_prompts(limit: int = Query(10, ge=1, le=100),
+                       db: firestore.AsyncClient = Depends(get_async_db)):
     try:
-        snap = col().order_by("ts", direction="DESCENDING").limit(limit).get()
+        snap = await col(db).order_by("ts", direction="DESCENDING").limit(limit).get()
         items = [ {"id": d.id, **d.to_dict()} for d in snap ]
         return {"items": items}
     except Exception as e:
         raise HTTPException(400, str(e))
 
+@router.get("/stats")
+async def prompt_stats(days: int = Query(7, ge=1, le=90),
+                       model: Optional[str] = Query(None),
+                       db: firestore.AsyncClient = Depends(get_async_db)):
+    """Acumulados por día y modelo (llamadas, hits de caché, tokens, latencia) desde `prompt_stats`."""
+    return {"items": await read_stats(db, days, model)}
+
+@router.get("/routing")
+async def routing_table():
+    """Tabla de rutas configurada y p95 reciente por modelo, para ajustar VERTEX_ROUTES."""
+    return model_router.table()
+
 @router.get("/{id}")
-def get_prompt(id: str):
-    d = col().document(id).get()
+async def get_prompt(id: str, if_none_match: str | None = Header(default=None),
+                     db: firestore.AsyncClient = Depends(get_async_db)):
+    d = await get_doc(col(db).document(id))
     if not d.exists: raise HTTPException(404, "not_found")
-    return {"id": d.id, **d.to_dict()}
+    tag = etag_of(d.update_time)
+    if not_modified(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return FastJSONResponse({"id": d.id, **d.to_dict()}, headers={"ETag": tag})
 
 @router.put("/{id}")
-def update_prompt(id: str, body: PromptUpdate):
-    ref = col().document(id)
-    if not ref.get().exists: raise HTTPException(404, "not_found")
-    ref.set({k:v for k,v in body.dict().items() if v is not None}, merge=True)
-    return {"id": id, **ref.get().to_dict()}
+async def update_prompt(id: str, body: PromptUpdate, response: Response,
+                        if_match: str | None = Header(default=None),
+                        db: firestore.AsyncClient = Depends(get_async_db)):
+    patch = {k: v for k, v in body.model_dump().items() if v is not None}
+    result = await update_doc(col(db).document(id), patch, if_match)
+    response.headers["ETag"] = etag_of(result["updateTime"])
+    return result
 
 @router.delete("/{id}", status_code=204)
-def delete_prompt(id: str):
-    col().document(id).delete()
- 
\ No newline at end of file
+async def delete_prompt(id: str, db: firestore.AsyncClient = Depends(get_async_db)):
+    await delete_doc(col(db).document(id))
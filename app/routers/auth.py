@@ -1,7 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import firebase_admin
-from firebase_admin import auth, credentials
+from starlette.concurrency import run_in_threadpool
 import os
 from typing import Optional
 from dotenv import load_dotenv
@@ -19,12 +18,20 @@ class TokenResponse(BaseModel):
     expires_in: int
     user_id: str
 
+def _firebase_admin():
+    # firebase_admin se importa en el primer uso para no cargarlo al arrancar la app;
+    # los handlers lo llaman en el threadpool para no bloquear el event loop con el import
+    import firebase_admin
+    from firebase_admin import auth, credentials
+    return firebase_admin, auth, credentials
+
 @router.post("/auth/token", response_model=TokenResponse, tags=["auth"])
 async def generate_test_token(request: LoginRequest):
     """
     Genera un token de Firebase para testing automático.
     Este endpoint está diseñado para facilitar las pruebas con Postman.
     """
+    firebase_admin, auth, credentials = await run_in_threadpool(_firebase_admin)
     try:
         # Inicializar Firebase Admin si no está inicializado
         if not firebase_admin._apps:
@@ -63,6 +70,7 @@ async def auth_health():
     """
     Verifica que Firebase Admin esté configurado correctamente
     """
+    firebase_admin, auth, credentials = await run_in_threadpool(_firebase_admin)
     try:
         if not firebase_admin._apps:
             project_id = os.getenv('GCLOUD_PROJECT', 'trailogo-dev')
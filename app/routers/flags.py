@@ -1,72 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from google.cloud import firestore
 from datetime import datetime, timezone
-from ..deps import get_db, auth_dependency
-from ..models import FlagIn, FlagOut
+from ..deps import get_db, get_async_db, auth_dependency
+from ..flag_store import FlagStore
+from ..store import get_doc, create_doc, update_doc, delete_doc, batch_get, parse_fields, project, etag_of, not_modified
+from ..serializers import FastJSONResponse, flags_to_dict
+from ..models import FlagIn, FlagOut, FlagEvalIn
 
 router = APIRouter()
 
-def _doc_to_dict(doc):
-    d = doc.to_dict() or {}
-    d["id"] = doc.id
-    for k in ("ts", "createdAt", "updatedAt"):
-        v = d.get(k)
-        try:
-            if hasattr(v, "to_datetime"):
-                d[k] = v.to_datetime().isoformat()
-            elif hasattr(v, "isoformat"):
-                d[k] = v.isoformat()
-        except Exception:
-            pass
-    return d
+# Copia en memoria de la colección, al día vía on_snapshot (ver app/flag_store.py)
+flag_store = FlagStore(flags_to_dict)
 
 @router.get("/", response_model=dict)
-def list_flags(scope: str | None = Query(default=None),
-               key: str | None = Query(default=None),
-               limit: int = Query(default=20, ge=1, le=100),
-               db: firestore.Client = Depends(get_db),
-               _=Depends(auth_dependency)):
-    q = db.collection("flags")
-    if scope:
-        q = q.where("scope","==", scope)
-    if key:
-        q = q.where("key","==", key)
-    q = q.limit(limit)
-    docs = q.stream()
-    items = [_doc_to_dict(d) for d in docs]
-    return {"items": items}
+async def list_flags(scope: str | None = Query(default=None),
+                     key: str | None = Query(default=None),
+                     limit: int = Query(default=20, ge=1, le=100),
+                     fields: str | None = Query(default=None, description="Campos a devolver, p. ej. key,value"),
+                     _=Depends(auth_dependency)):
+    fields = parse_fields(fields, FlagIn)
+    await flag_store.ensure_fresh(get_db)
+    items = [project(f, fields) for f in flag_store.items()
+             if (not scope or f.get("scope") == scope) and (not key or f.get("key") == key)]
+    return FastJSONResponse({"items": items[:limit]})
+
+@router.post(":evaluate", response_model=dict)
+async def evaluate_flags(body: FlagEvalIn,
+                         _=Depends(auth_dependency)):
+    """Resuelve en memoria el valor efectivo de cada key (scope user sobre global)."""
+    await flag_store.ensure_fresh(get_db)
+    return {"userId": body.userId, **flag_store.evaluate(body.keys, body.userId)}
 
 @router.post("/", response_model=FlagOut, status_code=201)
-def create_flag(payload: FlagIn,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
+async def create_flag(payload: FlagIn,
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
     data = payload.model_dump()
     data["updatedAt"] = data.get("updatedAt") or datetime.now(timezone.utc)
-    ref = db.collection("flags").add(data)[1]
-    return _doc_to_dict(ref.get())
+    return await create_doc(db.collection("flags"), data)
+
+@router.get(":batchGet", response_model=dict)
+async def batch_get_flags(ids: list[str] = Query(...),
+                          fields: str | None = Query(default=None),
+                          db: firestore.AsyncClient = Depends(get_async_db),
+                          _=Depends(auth_dependency)):
+    """Lee hasta 100 documentos en un solo round trip, en el orden de `ids`."""
+    return FastJSONResponse(await batch_get(db, "flags", ids, flags_to_dict, parse_fields(fields, FlagIn)))
 
 @router.get("/{doc_id}", response_model=FlagOut)
-def get_flag(doc_id: str,
-             db: firestore.Client = Depends(get_db),
-             _=Depends(auth_dependency)):
-    doc = db.collection("flags").document(doc_id).get()
+async def get_flag(doc_id: str,
+                   fields: str | None = Query(default=None),
+                   if_none_match: str | None = Header(default=None),
+                   db: firestore.AsyncClient = Depends(get_async_db),
+                   _=Depends(auth_dependency)):
+    fields = parse_fields(fields, FlagIn)
+    doc = await get_doc(db.collection("flags").document(doc_id), fields)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="not_found")
-    return _doc_to_dict(doc)
+    tag = etag_of(doc.update_time, fields)
+    if not_modified(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return FastJSONResponse(project(flags_to_dict(doc), fields), headers={"ETag": tag})
 
-@router.put("/{doc_id}", response_model=FlagOut)
-def update_flag(doc_id: str, patch: dict,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
-    ref = db.collection("flags").document(doc_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="not_found")
-    ref.set(patch, merge=True)
-    return _doc_to_dict(ref.get())
+@router.put("/{doc_id}", response_model=dict)
+async def update_flag(doc_id: str, patch: dict,
+                      response: Response,
+                      if_match: str | None = Header(default=None),
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
+    result = await update_doc(db.collection("flags").document(doc_id), patch, if_match)
+    response.headers["ETag"] = etag_of(result["updateTime"])
+    return result
 
 @router.delete("/{doc_id}", status_code=204)
-def delete_flag(doc_id: str,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
-    db.collection("flags").document(doc_id).delete()
+async def delete_flag(doc_id: str,
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
+    await delete_doc(db.collection("flags").document(doc_id))
     return
@@ -1,83 +1,142 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
 from google.cloud import firestore_v1 as firestore
 from datetime import datetime, timezone
-from ..deps import get_db, auth_dependency
-from ..models import HistoryIn, HistoryOut
+import re
+import zlib
+from urllib.parse import quote
+from ..deps import get_async_db, auth_dependency
+from ..store import get_doc, create_doc, update_doc, delete_doc, batch_create, batch_get, parse_fields, project, etag_of, not_modified
+from ..pagination import by_ts, ordered_by_ts, page
+from ..serializers import FastJSONResponse, dumps, history_to_dict
+from ..models import BatchCreateIn, HistoryIn, HistoryOut
+from ..translation_memory import memory
 
 router = APIRouter()
 
-def _doc_to_dict(doc):
-    d = doc.to_dict() or {}
-    d["id"] = doc.id
-    for k in ("ts", "createdAt", "updatedAt"):
-        v = d.get(k)
-        try:
-            if hasattr(v, "to_datetime"):
-                d[k] = v.to_datetime().isoformat()
-            elif hasattr(v, "isoformat"):
-                d[k] = v.isoformat()
-        except Exception:
-            pass
-    return d
+EXPORT_CHUNK = 500  # documentos por consulta al exportar
+
+def _prepare(data: dict) -> dict:
+    data["ts"] = data.get("ts") or datetime.now(timezone.utc)
+    return data
 
 @router.get("/", response_model=dict)
-def list_history(userId: str | None = Query(default=None),
-                 limit: int = Query(default=20, ge=1, le=100),
-                 db: firestore.Client = Depends(get_db),
-                 _=Depends(auth_dependency)):
+async def list_history(userId: str | None = Query(default=None),
+                       limit: int = Query(default=20, ge=1, le=100),
+                       cursor: str | None = Query(default=None),
+                       fields: str | None = Query(default=None, description="Campos a devolver, p. ej. ts,sourceLang,targetLang"),
+                       db: firestore.AsyncClient = Depends(get_async_db),
+                       _=Depends(auth_dependency)):
+    fields = parse_fields(fields, HistoryIn)
     q = db.collection("history")
-    
-    # Estrategia: aplicar filtros pero NO ordenar para evitar índices complejos
     if userId:
         q = q.where("userId", "==", userId)
-    
-    # Obtener más documentos de los solicitados para poder ordenar en memoria
-    fetch_limit = min(limit * 2, 100)  # Fetch el doble pero máximo 100
-    q = q.limit(fetch_limit)
-    
-    docs = list(q.stream())
-    
-    # Ordenar en memoria por timestamp descendente si hay datos
-    if docs:
-        docs.sort(key=lambda doc: doc.to_dict().get("ts", datetime.min.replace(tzinfo=timezone.utc)), reverse=True)
-    
-    # Aplicar el límite final después del ordenamiento
-    docs = docs[:limit]
-    items = [_doc_to_dict(d) for d in docs]
-    return {"items": items}
+    # Una sola consulta acotada: orden por ts en Firestore (índice userId+ts) y cursor keyset
+    q = ordered_by_ts(q, cursor, limit, fields)
+    docs, next_cursor = page([d async for d in q.stream()], limit)
+    items = [project(history_to_dict(d), fields) for d in docs]
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @router.post("/", response_model=HistoryOut, status_code=201)
-def create_history(payload: HistoryIn,
-                   db: firestore.Client = Depends(get_db),
-                   _=Depends(auth_dependency)):
-    data = payload.model_dump()
-    data["ts"] = data.get("ts") or datetime.now(timezone.utc)
-    ref = db.collection("history").add(data)[1]
-    doc = ref.get()
-    return _doc_to_dict(doc)
+async def create_history(payload: HistoryIn,
+                         db: firestore.AsyncClient = Depends(get_async_db),
+                         _=Depends(auth_dependency)):
+    created = await create_doc(db.collection("history"), _prepare(payload.model_dump()))
+    memory.add(payload.sourceLang, payload.targetLang, payload.text, payload.result)
+    return created
+
+@router.post(":batchCreate", response_model=dict)
+async def batch_create_history(body: BatchCreateIn,
+                               db: firestore.AsyncClient = Depends(get_async_db),
+                               _=Depends(auth_dependency)):
+    """Crea varios registros en lotes de hasta 500 escrituras; reporta id o error por item."""
+    result = await batch_create(db, "history", body.items, HistoryIn, _prepare)
+    for r in result["items"]:
+        if "id" in r:
+            item = body.items[r["index"]]
+            memory.add(item["sourceLang"], item["targetLang"], item["text"], item["result"])
+    return result
+
+@router.get(":batchGet", response_model=dict)
+async def batch_get_history(ids: list[str] = Query(...),
+                            fields: str | None = Query(default=None),
+                            db: firestore.AsyncClient = Depends(get_async_db),
+                            _=Depends(auth_dependency)):
+    """Lee hasta 100 documentos en un solo round trip, en el orden de `ids`."""
+    return FastJSONResponse(await batch_get(db, "history", ids, history_to_dict, parse_fields(fields, HistoryIn)))
+
+async def _export_lines(db, userId: str):
+    """Recorre el historial del usuario por páginas keyset y emite una línea NDJSON por documento.
+
+    Solo se mantiene en memoria el último snapshot (para start_after), así que el consumo
+    no depende del tamaño del historial.
+    """
+    base = by_ts(db.collection("history").where("userId", "==", userId))
+    last = None
+    while True:
+        q = base.start_after(last) if last is not None else base
+        n = 0
+        async for d in q.limit(EXPORT_CHUNK).stream():
+            yield dumps(history_to_dict(d)) + b"\n"
+            last = d
+            n += 1
+        if n < EXPORT_CHUNK:
+            return
+
+async def _gzipped(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    async for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+def _attachment(filename: str) -> str:
+    """Content-Disposition con un nombre ASCII de respaldo y el nombre real en UTF-8 (RFC 5987)."""
+    fallback = re.sub(r"[^A-Za-z0-9._-]", "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+@router.get("/export")
+async def export_history(userId: str = Query(...),
+                         gzip: bool = Query(default=False),
+                         db: firestore.AsyncClient = Depends(get_async_db),
+                         _=Depends(auth_dependency)):
+    """Exporta todo el historial de un usuario como NDJSON en streaming (opcionalmente gzip)."""
+    body = _export_lines(db, userId)
+    headers = {"Content-Disposition": _attachment(f"history-{userId}.ndjson")}
+    if gzip:
+        body = _gzipped(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
 
 @router.get("/{doc_id}", response_model=HistoryOut)
-def get_history(doc_id: str,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
-    doc = db.collection("history").document(doc_id).get()
+async def get_history(doc_id: str,
+                      fields: str | None = Query(default=None),
+                      if_none_match: str | None = Header(default=None),
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
+    fields = parse_fields(fields, HistoryIn)
+    doc = await get_doc(db.collection("history").document(doc_id), fields)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="not_found")
-    return _doc_to_dict(doc)
+    tag = etag_of(doc.update_time, fields)
+    if not_modified(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return FastJSONResponse(project(history_to_dict(doc), fields), headers={"ETag": tag})
 
-@router.put("/{doc_id}", response_model=HistoryOut)
-def update_history(doc_id: str, patch: dict,
-                   db: firestore.Client = Depends(get_db),
-                   _=Depends(auth_dependency)):
-    ref = db.collection("history").document(doc_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="not_found")
-    ref.set(patch, merge=True)
-    return _doc_to_dict(ref.get())
+@router.put("/{doc_id}", response_model=dict)
+async def update_history(doc_id: str, patch: dict,
+                         response: Response,
+                         if_match: str | None = Header(default=None),
+                         db: firestore.AsyncClient = Depends(get_async_db),
+                         _=Depends(auth_dependency)):
+    result = await update_doc(db.collection("history").document(doc_id), patch, if_match)
+    response.headers["ETag"] = etag_of(result["updateTime"])
+    return result
 
 @router.delete("/{doc_id}", status_code=204)
-def delete_history(doc_id: str,
-                   db: firestore.Client = Depends(get_db),
-                   _=Depends(auth_dependency)):
-    db.collection("history").document(doc_id).delete()
+async def delete_history(doc_id: str,
+                         db: firestore.AsyncClient = Depends(get_async_db),
+                         _=Depends(auth_dependency)):
+    await delete_doc(db.collection("history").document(doc_id))
     return
@@ -1,83 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from google.cloud import firestore
 from datetime import datetime, timezone
-from ..deps import get_db, auth_dependency
-from ..models import ObjectIn, ObjectOut
+from ..deps import get_async_db, auth_dependency
+from ..store import get_doc, create_doc, update_doc, delete_doc, batch_create, batch_get, parse_fields, project, etag_of, not_modified
+from ..pagination import ordered_by_ts, page
+from ..serializers import FastJSONResponse, objects_to_dict
+from ..models import BatchCreateIn, ObjectIn, ObjectOut
 
 router = APIRouter()
 
-def _doc_to_dict(doc):
-    d = doc.to_dict() or {}
-    d["id"] = doc.id
-    for k in ("ts", "createdAt", "updatedAt"):
-        v = d.get(k)
-        try:
-            if hasattr(v, "to_datetime"):
-                d[k] = v.to_datetime().isoformat()
-            elif hasattr(v, "isoformat"):
-                d[k] = v.isoformat()
-        except Exception:
-            pass
-    return d
+def _prepare(data: dict) -> dict:
+    data["ts"] = data.get("ts") or datetime.now(timezone.utc)
+    return data
 
 @router.get("/", response_model=dict)
-def list_objects(createdBy: str | None = Query(default=None),
-                 limit: int = Query(default=20, ge=1, le=100),
-                 db: firestore.Client = Depends(get_db),
-                 _=Depends(auth_dependency)):
+async def list_objects(createdBy: str | None = Query(default=None),
+                       limit: int = Query(default=20, ge=1, le=100),
+                       cursor: str | None = Query(default=None),
+                       fields: str | None = Query(default=None, description="Campos a devolver, p. ej. label,ts"),
+                       db: firestore.AsyncClient = Depends(get_async_db),
+                       _=Depends(auth_dependency)):
+    fields = parse_fields(fields, ObjectIn)
     q = db.collection("objects")
-    
-    # Estrategia: aplicar filtros pero NO ordenar para evitar índices complejos
     if createdBy:
         q = q.where("createdBy", "==", createdBy)
-    
-    # Obtener más documentos de los solicitados para poder ordenar en memoria
-    fetch_limit = min(limit * 2, 100)  # Fetch el doble pero máximo 100
-    q = q.limit(fetch_limit)
-    
-    docs = list(q.stream())
-    
-    # Ordenar en memoria por timestamp descendente si hay datos
-    if docs:
-        from datetime import datetime, timezone
-        docs.sort(key=lambda doc: doc.to_dict().get("ts", datetime.min.replace(tzinfo=timezone.utc)), reverse=True)
-    
-    # Aplicar el límite final después del ordenamiento
-    docs = docs[:limit]
-    items = [_doc_to_dict(d) for d in docs]
-    return {"items": items}
+    # Una sola consulta acotada: orden por ts en Firestore (índice createdBy+ts) y cursor keyset
+    q = ordered_by_ts(q, cursor, limit, fields)
+    docs, next_cursor = page([d async for d in q.stream()], limit)
+    items = [project(objects_to_dict(d), fields) for d in docs]
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
 
 @router.post("/", response_model=ObjectOut, status_code=201)
-def create_object(payload: ObjectIn,
-                  db: firestore.Client = Depends(get_db),
-                  _=Depends(auth_dependency)):
-    data = payload.model_dump()
-    data["ts"] = data.get("ts") or datetime.now(timezone.utc)
-    ref = db.collection("objects").add(data)[1]
-    return _doc_to_dict(ref.get())
+async def create_object(payload: ObjectIn,
+                        db: firestore.AsyncClient = Depends(get_async_db),
+                        _=Depends(auth_dependency)):
+    return await create_doc(db.collection("objects"), _prepare(payload.model_dump()))
+
+@router.post(":batchCreate", response_model=dict)
+async def batch_create_objects(body: BatchCreateIn,
+                               db: firestore.AsyncClient = Depends(get_async_db),
+                               _=Depends(auth_dependency)):
+    """Crea varios registros en lotes de hasta 500 escrituras; reporta id o error por item."""
+    return await batch_create(db, "objects", body.items, ObjectIn, _prepare)
+
+@router.get(":batchGet", response_model=dict)
+async def batch_get_objects(ids: list[str] = Query(...),
+                            fields: str | None = Query(default=None),
+                            db: firestore.AsyncClient = Depends(get_async_db),
+                            _=Depends(auth_dependency)):
+    """Lee hasta 100 documentos en un solo round trip, en el orden de `ids`."""
+    return FastJSONResponse(await batch_get(db, "objects", ids, objects_to_dict, parse_fields(fields, ObjectIn)))
 
 @router.get("/{doc_id}", response_model=ObjectOut)
-def get_object(doc_id: str,
-               db: firestore.Client = Depends(get_db),
-               _=Depends(auth_dependency)):
-    doc = db.collection("objects").document(doc_id).get()
+async def get_object(doc_id: str,
+                     fields: str | None = Query(default=None),
+                     if_none_match: str | None = Header(default=None),
+                     db: firestore.AsyncClient = Depends(get_async_db),
+                     _=Depends(auth_dependency)):
+    fields = parse_fields(fields, ObjectIn)
+    doc = await get_doc(db.collection("objects").document(doc_id), fields)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="not_found")
-    return _doc_to_dict(doc)
+    tag = etag_of(doc.update_time, fields)
+    if not_modified(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return FastJSONResponse(project(objects_to_dict(doc), fields), headers={"ETag": tag})
 
-@router.put("/{doc_id}", response_model=ObjectOut)
-def update_object(doc_id: str, patch: dict,
-                  db: firestore.Client = Depends(get_db),
-                  _=Depends(auth_dependency)):
-    ref = db.collection("objects").document(doc_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="not_found")
-    ref.set(patch, merge=True)
-    return _doc_to_dict(ref.get())
+@router.put("/{doc_id}", response_model=dict)
+async def update_object(doc_id: str, patch: dict,
+                        response: Response,
+                        if_match: str | None = Header(default=None),
+                        db: firestore.AsyncClient = Depends(get_async_db),
+                        _=Depends(auth_dependency)):
+    result = await update_doc(db.collection("objects").document(doc_id), patch, if_match)
+    response.headers["ETag"] = etag_of(result["updateTime"])
+    return result
 
 @router.delete("/{doc_id}", status_code=204)
-def delete_object(doc_id: str,
-                  db: firestore.Client = Depends(get_db),
-                  _=Depends(auth_dependency)):
-    db.collection("objects").document(doc_id).delete()
+async def delete_object(doc_id: str,
+                        db: firestore.AsyncClient = Depends(get_async_db),
+                        _=Depends(auth_dependency)):
+    await delete_doc(db.collection("objects").document(doc_id))
     return
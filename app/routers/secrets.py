@@ -1,22 +1,38 @@
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from google.cloud import secretmanager
+from concurrent.futures import ThreadPoolExecutor
 import os
+from ..secret_cache import secret_cache
+from ..clients import clients
 
 router = APIRouter(prefix="/api/v1/secrets", tags=["secrets"])
 
 PROJECT_ID = os.getenv("GCLOUD_PROJECT")
+SECRETS_BATCH_MAX_ITEMS = 100
+SECRETS_BATCH_WORKERS = int(os.getenv("SECRETS_BATCH_WORKERS", "16"))
 
 class SecretCreate(BaseModel):
     key: str = Field(..., description="ID del secreto (único en el proyecto)")
     value: str = Field(..., description="Contenido de la versión inicial")
     labels: Optional[dict] = None
 
+class SecretRef(BaseModel):
+    key: str
+    version: str = Field("latest", pattern=r"^(latest|\d+)$", description="Versión fija (número) o latest")
+
+class SecretBatchAccessIn(BaseModel):
+    items: List[SecretRef] = Field(..., description="Secretos a resolver; la respuesta respeta el orden")
+
 class SecretUpdate(BaseModel):
     value: str = Field(..., description="Nuevo valor (crea nueva versión)")
 
-client = secretmanager.SecretManagerServiceClient()
+def client():
+    # SecretManagerServiceClient se construye en el primer uso, no al importar el router
+    return clients.get("secretmanager")
+
+# Pool acotado para resolver varios secretos en paralelo (el cliente gRPC es thread-safe)
+executor = ThreadPoolExecutor(max_workers=SECRETS_BATCH_WORKERS, thread_name_prefix="secrets")
 
 def secret_name(key: str) -> str:
     return f"projects/{PROJECT_ID}/secrets/{key}"
@@ -26,7 +42,7 @@ def create_secret(body: SecretCreate):
     parent = f"projects/{PROJECT_ID}"
     # Crea el secreto (metadata)
     try:
-        client.create_secret(
+        client().create_secret(
             request={
                 "parent": parent,
                 "secret_id": body.key,
@@ -43,7 +59,7 @@ def create_secret(body: SecretCreate):
 
     # Crea la versión inicial
     try:
-        client.add_secret_version(
+        client().add_secret_version(
             request={
                 "parent": secret_name(body.key),
                 "payload": {"data": body.value.encode("utf-8")}
@@ -51,27 +67,61 @@ def create_secret(body: SecretCreate):
         )
     except Exception as e:
         raise HTTPException(400, f"add_secret_version: {e}")
+    secret_cache.invalidate(body.key, aliases_only=True)
 
     return {"id": body.key, "labels": body.labels or {}}
 
 @router.get("")
-def list_secrets(prefix: Optional[str] = Query(None, description="Filtra por prefijo")):
+def list_secrets(prefix: Optional[str] = Query(None, description="Filtra por prefijo"),
+                 page_size: int = Query(100, ge=1, le=1000),
+                 page_token: Optional[str] = Query(None, description="next_page_token de la página anterior")):
     parent = f"projects/{PROJECT_ID}"
+    request = {"parent": parent, "page_size": page_size}
+    if prefix:
+        # El filtro se evalúa en Secret Manager; `name:` es "contiene", el prefijo exacto se comprueba abajo
+        request["filter"] = f"name:{prefix}"
+    if page_token:
+        request["page_token"] = page_token
+    try:
+        # Solo una página: no se drena el pager
+        page = next(iter(client().list_secrets(request=request).pages))
+    except StopIteration:
+        return {"items": [], "next_page_token": None}
+    except Exception as e:
+        raise HTTPException(400, f"list_secrets: {e}")
     items = []
-    for s in client.list_secrets(request={"parent": parent}):
+    for s in page.secrets:
         sid = s.name.split("/")[-1]
         if prefix and not sid.startswith(prefix):
             continue
         items.append({"id": sid, "labels": dict(s.labels)})
-    return {"items": items}
+    return {"items": items, "next_page_token": page.next_page_token or None}
+
+def _access(ref: SecretRef) -> dict:
+    try:
+        return {"id": ref.key, **secret_cache.access(client(), secret_name(ref.key), ref.key, ref.version)}
+    except Exception as e:
+        return {"id": ref.key, "version": ref.version, "error": f"access_secret_version: {e}"}
+
+@router.post(":batchAccess")
+def batch_access_secrets(body: SecretBatchAccessIn):
+    """Resuelve varios secretos a la vez (misma caché que la lectura individual).
+
+    Devuelve valor o `error` por item en el orden recibido; la latencia total se acerca a
+    la de un solo round trip mientras haya workers libres.
+    """
+    if len(body.items) > SECRETS_BATCH_MAX_ITEMS:
+        raise HTTPException(400, f"too_many_items (max {SECRETS_BATCH_MAX_ITEMS})")
+    items = list(executor.map(_access, body.items))
+    failed = sum(1 for i in items if "error" in i)
+    return {"items": items, "resolved": len(items) - failed, "failed": failed}
 
 @router.get("/{key}")
-def get_secret_latest(key: str):
-    name = f"{secret_name(key)}/versions/latest"
+def get_secret_latest(key: str,
+                      version: str = Query("latest", pattern=r"^(latest|\d+)$",
+                                           description="Versión fija (número) o latest; las fijas se cachean sin vencimiento")):
     try:
-        resp = client.access_secret_version(request={"name": name})
-        value = resp.payload.data.decode("utf-8")
-        return {"id": key, "value": value}
+        return {"id": key, **secret_cache.access(client(), secret_name(key), key, version)}
     except Exception as e:
         raise HTTPException(404, f"access_secret_version: {e}")
 
@@ -79,12 +129,14 @@ def get_secret_latest(key: str):
 def update_secret_add_version(key: str, body: SecretUpdate):
     # En Secret Manager, “update” se modela como crear una nueva versión
     try:
-        client.add_secret_version(
+        client().add_secret_version(
             request={
                 "parent": secret_name(key),
                 "payload": {"data": body.value.encode("utf-8")}
             }
         )
+        # Las versiones numéricas no cambian; solo `latest` apunta ahora a otra
+        secret_cache.invalidate(key, aliases_only=True)
         return {"id": key, "updated": True}
     except Exception as e:
         raise HTTPException(400, f"add_secret_version: {e}")
@@ -92,6 +144,7 @@ def update_secret_add_version(key: str, body: SecretUpdate):
 @router.delete("/{key}", status_code=204)
 def delete_secret(key: str):
     try:
-        client.delete_secret(request={"name": secret_name(key)})
+        client().delete_secret(request={"name": secret_name(key)})
+        secret_cache.invalidate(key)
     except Exception as e:
         raise HTTPException(400, f"delete_secret: {e}")
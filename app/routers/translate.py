@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException, Depends
+from google.cloud import firestore
+from pydantic import BaseModel, Field
+
+from ..deps import get_async_db, auth_dependency
+from ..translation import batcher
+from ..translation_memory import memory
+from ..vertex import vertex_error
+
+router = APIRouter(prefix="/api/v1/translate", tags=["translate"])
+
+class TranslateIn(BaseModel):
+    sourceLang: str = Field(..., description="Idioma de origen, p. ej. es")
+    targetLang: str = Field(..., description="Idioma de destino, p. ej. en")
+    text: str = Field(..., min_length=1, description="Frase a traducir")
+
+@router.post("")
+async def translate(body: TranslateIn, user=Depends(auth_dependency)):
+    # Primero la memoria de traducciones (history); solo si no está se llama al modelo.
+    # Si el índice aún no se cargó no se espera: se lanza la carga y esta request va al modelo
+    memory.warm(get_async_db)
+    result = memory.lookup(body.sourceLang, body.targetLang, body.text)
+    source = "memory"
+    if result is None:
+        # Las requests que llegan en la misma ventana (por par de idiomas) comparten una llamada al modelo
+        try:
+            result = await batcher.translate(body.sourceLang, body.targetLang, body.text)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise vertex_error(e)
+        memory.add(body.sourceLang, body.targetLang, body.text, result)
+        source = "model"
+    return {"sourceLang": body.sourceLang, "targetLang": body.targetLang, "text": body.text,
+            "result": result, "source": source}
+
+@router.get("/memory")
+async def memory_stats(user=Depends(auth_dependency)):
+    """Tamaño y memoria aproximada del índice de traducciones."""
+    return memory.stats()
+
+@router.post("/memory:rebuild")
+async def memory_rebuild(user=Depends(auth_dependency),
+                         db: firestore.AsyncClient = Depends(get_async_db)):
+    """Reconstruye el índice desde `history` (un escaneo completo de la colección)."""
+    return await memory.rebuild(db)
@@ -1,69 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
 from google.cloud import firestore
 from datetime import datetime, timezone
-from ..deps import get_db, auth_dependency
+from ..deps import get_async_db, auth_dependency
+from ..store import get_doc, create_doc, update_doc, delete_doc, batch_get, parse_fields, project, etag_of, not_modified
+from ..serializers import FastJSONResponse, users_to_dict
 from ..models import UserIn, UserOut
 
 router = APIRouter()
 
-def _doc_to_dict(doc):
-    d = doc.to_dict() or {}
-    d["id"] = doc.id
-    for k in ("ts", "createdAt", "updatedAt"):
-        v = d.get(k)
-        try:
-            if hasattr(v, "to_datetime"):
-                d[k] = v.to_datetime().isoformat()
-            elif hasattr(v, "isoformat"):
-                d[k] = v.isoformat()
-        except Exception:
-            pass
-    return d
-
 @router.get("/", response_model=dict)
-def list_users(email: str | None = Query(default=None),
-               limit: int = Query(default=20, ge=1, le=100),
-               db: firestore.Client = Depends(get_db),
-               _=Depends(auth_dependency)):
+async def list_users(email: str | None = Query(default=None),
+                     limit: int = Query(default=20, ge=1, le=100),
+                     fields: str | None = Query(default=None, description="Campos a devolver, p. ej. email,displayName"),
+                     db: firestore.AsyncClient = Depends(get_async_db),
+                     _=Depends(auth_dependency)):
+    fields = parse_fields(fields, UserIn)
     q = db.collection("users")
     if email:
         q = q.where("email","==", email)
+    if fields is not None:
+        q = q.select(fields)
     q = q.limit(limit)
-    docs = q.stream()
-    items = [_doc_to_dict(d) for d in docs]
-    return {"items": items}
+    items = [users_to_dict(d) async for d in q.stream()]
+    return FastJSONResponse({"items": items})
 
 @router.post("/", response_model=UserOut, status_code=201)
-def create_user(payload: UserIn,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
+async def create_user(payload: UserIn,
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
     data = payload.model_dump()
     data["createdAt"] = data.get("createdAt") or datetime.now(timezone.utc)
-    ref = db.collection("users").add(data)[1]
-    return _doc_to_dict(ref.get())
+    return await create_doc(db.collection("users"), data)
+
+@router.get(":batchGet", response_model=dict)
+async def batch_get_users(ids: list[str] = Query(...),
+                          fields: str | None = Query(default=None),
+                          db: firestore.AsyncClient = Depends(get_async_db),
+                          _=Depends(auth_dependency)):
+    """Lee hasta 100 documentos en un solo round trip, en el orden de `ids`."""
+    return FastJSONResponse(await batch_get(db, "users", ids, users_to_dict, parse_fields(fields, UserIn)))
 
 @router.get("/{doc_id}", response_model=UserOut)
-def get_user(doc_id: str,
-             db: firestore.Client = Depends(get_db),
-             _=Depends(auth_dependency)):
-    doc = db.collection("users").document(doc_id).get()
+async def get_user(doc_id: str,
+                   fields: str | None = Query(default=None),
+                   if_none_match: str | None = Header(default=None),
+                   db: firestore.AsyncClient = Depends(get_async_db),
+                   _=Depends(auth_dependency)):
+    fields = parse_fields(fields, UserIn)
+    doc = await get_doc(db.collection("users").document(doc_id), fields)
     if not doc.exists:
         raise HTTPException(status_code=404, detail="not_found")
-    return _doc_to_dict(doc)
+    tag = etag_of(doc.update_time, fields)
+    if not_modified(if_none_match, tag):
+        return Response(status_code=304, headers={"ETag": tag})
+    return FastJSONResponse(project(users_to_dict(doc), fields), headers={"ETag": tag})
 
-@router.put("/{doc_id}", response_model=UserOut)
-def update_user(doc_id: str, patch: dict,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
-    ref = db.collection("users").document(doc_id)
-    if not ref.get().exists:
-        raise HTTPException(status_code=404, detail="not_found")
-    ref.set(patch, merge=True)
-    return _doc_to_dict(ref.get())
+@router.put("/{doc_id}", response_model=dict)
+async def update_user(doc_id: str, patch: dict,
+                      response: Response,
+                      if_match: str | None = Header(default=None),
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
+    result = await update_doc(db.collection("users").document(doc_id), patch, if_match)
+    response.headers["ETag"] = etag_of(result["updateTime"])
+    return result
 
 @router.delete("/{doc_id}", status_code=204)
-def delete_user(doc_id: str,
-                db: firestore.Client = Depends(get_db),
-                _=Depends(auth_dependency)):
-    db.collection("users").document(doc_id).delete()
+async def delete_user(doc_id: str,
+                      db: firestore.AsyncClient = Depends(get_async_db),
+                      _=Depends(auth_dependency)):
+    await delete_doc(db.collection("users").document(doc_id))
     return
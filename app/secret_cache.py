@@ -0,0 +1,62 @@
+import os
+import threading
+import time
+from . import metrics
+
+SECRETS_CACHE_TTL = float(os.getenv("SECRETS_CACHE_TTL", "300"))  # segundos, solo para "latest"
+
+def version_of(name: str) -> str:
+    """Número de versión de un nombre `projects/p/secrets/k/versions/N`."""
+    return name.rsplit("/", 1)[-1]
+
+class SecretCache:
+    """Valores de Secret Manager ya resueltos, por (key, versión).
+
+    `latest` se guarda SECRETS_CACHE_TTL segundos; una versión numérica es inmutable y se
+    guarda sin vencimiento. Al resolver `latest` también se guarda la versión concreta que
+    devolvió Secret Manager. Los cambios (nueva versión, borrado) llaman a `invalidate`.
+    Contadores `secrets.cache.hit` / `secrets.cache.miss`.
+    """
+
+    def __init__(self, ttl: float = SECRETS_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], tuple[float | None, str, str]] = {}
+
+    def _lookup(self, key: str, version: str) -> tuple[str, str] | None:
+        with self._lock:
+            entry = self._entries.get((key, version))
+            if entry is None:
+                return None
+            expires_at, value, resolved = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[(key, version)]
+                return None
+            return value, resolved
+
+    def access(self, client, name: str, key: str, version: str = "latest") -> dict:
+        """{value, version} de `key`; `name` es el nombre del secreto (`projects/p/secrets/k`)."""
+        hit = self._lookup(key, version)
+        if hit is not None:
+            metrics.incr("secrets.cache.hit")
+            return {"value": hit[0], "version": hit[1]}
+        metrics.incr("secrets.cache.miss")
+        resp = client.access_secret_version(request={"name": f"{name}/versions/{version}"})
+        value = resp.payload.data.decode("utf-8")
+        resolved = version_of(resp.name) if resp.name else version
+        with self._lock:
+            self._entries[(key, resolved)] = (None, value, resolved)
+            if version != resolved:
+                self._entries[(key, version)] = (time.monotonic() + self.ttl, value, resolved)
+        metrics.set_gauge("secrets.cache.size", len(self._entries))
+        return {"value": value, "version": resolved}
+
+    def invalidate(self, key: str, aliases_only: bool = False):
+        """Descarta las entradas de `key`; con `aliases_only` conserva las versiones numéricas."""
+        with self._lock:
+            for k in [k for k in self._entries if k[0] == key]:
+                if not (aliases_only and k[1].isdigit()):
+                    del self._entries[k]
+        metrics.set_gauge("secrets.cache.size", len(self._entries))
+
+secret_cache = SecretCache()
@@ -0,0 +1,52 @@
+import typing
+from datetime import datetime
+import orjson
+from fastapi.responses import JSONResponse
+from .models import HistoryIn, UserIn, ObjectIn, FlagIn
+
+# Serialización única de documentos Firestore -> dict JSON para todos los routers.
+
+def _orjson_default(v):
+    # orjson serializa datetime en C pero no sus subclases (DatetimeWithNanoseconds)
+    if isinstance(v, datetime):
+        return v.isoformat()
+    raise TypeError
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse con orjson. Devolverla desde un handler evita además la pasada por
+    response_model + jsonable_encoder que FastAPI hace sobre los dicts."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def _timestamp_fields(model) -> tuple[str, ...]:
+    return tuple(name for name, f in model.model_fields.items()
+                 if f.annotation is datetime or datetime in typing.get_args(f.annotation))
+
+def make_converter(model):
+    """Convertidor snapshot -> dict para una colección.
+
+    Los campos timestamp se calculan una vez desde el modelo Pydantic; por documento solo
+    se normalizan esos campos a ISO 8601, sin probes con hasattr ni try/except.
+    """
+    ts_fields = _timestamp_fields(model)
+
+    def to_dict(doc, _datetime=datetime):
+        d = doc.to_dict() or {}
+        d["id"] = doc.id
+        for k in ts_fields:
+            v = d.get(k)
+            if isinstance(v, _datetime):
+                d[k] = v.isoformat()
+        return d
+
+    to_dict.ts_fields = ts_fields
+    return to_dict
+
+history_to_dict = make_converter(HistoryIn)
+users_to_dict = make_converter(UserIn)
+objects_to_dict = make_converter(ObjectIn)
+flags_to_dict = make_converter(FlagIn)
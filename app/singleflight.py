@@ -0,0 +1,35 @@
+import asyncio
+from . import metrics
+
+class SingleFlight:
+    """Coalescencia de llamadas idénticas en curso (single-flight).
+
+    La primera llamada con una clave lanza `fn()` como tarea; las que llegan con la misma
+    clave mientras sigue en curso esperan esa misma tarea y comparten su resultado o su
+    excepción. La tarea va protegida con `shield`: si el cliente que la lanzó se desconecta,
+    los demás siguen esperando la llamada upstream. Contadores `<name>.leader` / `<name>.shared`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            metrics.incr(f"{self.name}.leader")
+        else:
+            metrics.incr(f"{self.name}.shared")
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # marca la excepción como recuperada aunque no quede nadie esperando
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,171 @@
+import hashlib
+import os
+from fastapi import HTTPException
+from google.api_core import exceptions as gexc
+from google.cloud.firestore_v1.base_client import BaseClient
+from google.protobuf.timestamp_pb2 import Timestamp
+from pydantic import ValidationError
+
+MAX_BATCH = 500  # límite de escrituras por commit de Firestore
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_GET_MAX_IDS = 100
+
+# Operaciones de documento compartidas por los routers. Cada operación de un documento hace
+# exactamente un round trip a Firestore (batch_create, uno por lote); el canal gRPC los
+# cuenta (app/firestore_rpc.py, header X-Firestore-RPCs).
+
+def parse_fields(fields: str | None, model) -> list[str] | None:
+    """`?fields=a,b` -> lista de campos validada contra el modelo (`id` siempre se incluye)."""
+    if not fields:
+        return None
+    requested = [f for f in dict.fromkeys(x.strip() for x in fields.split(",")) if f and f != "id"]
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown_fields: {','.join(unknown)}")
+    return requested
+
+def project(d: dict, fields: list[str] | None) -> dict:
+    if fields is None:
+        return d
+    return {k: v for k, v in d.items() if k == "id" or k in fields}
+
+def _ts_pb(update_time) -> Timestamp:
+    if hasattr(update_time, "timestamp_pb"):  # DatetimeWithNanoseconds de Firestore
+        return update_time.timestamp_pb()
+    ts = Timestamp()
+    ts.FromDatetime(update_time)
+    return ts
+
+def etag_of(update_time, fields: list[str] | None = None) -> str | None:
+    """ETag fuerte `"<segundos>.<nanos>"` a partir del update_time del documento.
+
+    Las respuestas proyectadas (`fields=`) son otra representación y llevan un sufijo.
+    """
+    if update_time is None:
+        return None
+    ts = _ts_pb(update_time)
+    tag = f"{ts.seconds}.{ts.nanos:09d}"
+    if fields is not None:
+        tag += "-" + hashlib.sha1(",".join(sorted(fields)).encode()).hexdigest()[:8]
+    return f'"{tag}"'
+
+def parse_etag(value: str) -> Timestamp:
+    try:
+        tag = value.strip().removeprefix("W/").strip('"').split("-", 1)[0]
+        seconds, nanos = tag.split(".")
+        return Timestamp(seconds=int(seconds), nanos=int(nanos))
+    except ValueError:
+        raise HTTPException(status_code=412, detail="precondition_failed")
+
+def not_modified(if_none_match: str | None, tag: str | None) -> bool:
+    if not if_none_match or tag is None:
+        return False
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in candidates or tag in candidates
+
+async def get_doc(ref, fields: list[str] | None = None):
+    snap = await ref.get(field_paths=fields)
+    return snap
+
+async def create_doc(col_ref, data: dict) -> dict:
+    """Crea el documento con ID automático y arma la respuesta desde el payload.
+
+    `add()` es un único commit con precondición exists=False; no se relee el documento.
+    """
+    update_time, ref = await col_ref.add(data)
+    return {**data, "id": ref.id, "updateTime": update_time}
+
+async def update_doc(ref, patch: dict, if_match: str | None = None) -> dict:
+    """Aplica `patch` con semántica de update(): si el documento no existe Firestore
+    responde NOT_FOUND (404) en el mismo commit, sin lectura previa.
+
+    Con `if_match` (ETag) el commit lleva la precondición last_update_time; si el
+    documento cambió desde entonces Firestore lo rechaza y se responde 412.
+    """
+    if not patch:
+        raise HTTPException(status_code=400, detail="empty_patch")
+    option = None
+    if if_match and if_match.strip() != "*":
+        option = BaseClient.write_option(last_update_time=parse_etag(if_match))
+    try:
+        result = await ref.update(patch, option=option)
+    except gexc.NotFound:
+        raise HTTPException(status_code=404, detail="not_found")
+    except gexc.FailedPrecondition:
+        raise HTTPException(status_code=412, detail="precondition_failed")
+    except ValueError as e:
+        # Field paths inválidos: se rechaza en el cliente, antes de llegar a Firestore
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**patch, "id": ref.id, "updateTime": result.update_time}
+
+async def delete_doc(ref):
+    await ref.delete()
+
+async def batch_create(db, collection: str, items: list, model, prepare) -> dict:
+    """Valida cada item con `model`, aplica `prepare(data)` y crea los válidos en
+    WriteBatch de hasta 500 escrituras (un commit por lote, como ingesta/ingestar_firestore.py).
+
+    Devuelve el resultado por item en el orden recibido: `id` si se creó o `error` si no.
+    """
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"too_many_items (max {BATCH_MAX_ITEMS})")
+    results: list[dict] = [{"index": i} for i in range(len(items))]
+    pending = []
+    for i, raw in enumerate(items):
+        try:
+            data = prepare(model.model_validate(raw).model_dump())
+        except ValidationError as e:
+            results[i]["error"] = e.errors(include_url=False, include_context=False, include_input=False)
+            continue
+        pending.append((i, data))
+
+    col = db.collection(collection)
+    for start in range(0, len(pending), MAX_BATCH):
+        group = pending[start:start + MAX_BATCH]
+        batch = db.batch()
+        refs = []
+        for _, data in group:
+            ref = col.document()
+            batch.create(ref, data)
+            refs.append(ref)
+        try:
+            write_results = await batch.commit()
+        except gexc.GoogleAPICallError as e:
+            for i, _ in group:
+                results[i]["error"] = str(e)
+            continue
+        for (i, _), ref, wr in zip(group, refs, write_results):
+            results[i].update(id=ref.id, updateTime=wr.update_time)
+
+    failed = sum(1 for r in results if "error" in r)
+    return {"items": results, "created": len(items) - failed, "failed": failed}
+
+def parse_ids(ids: list[str]) -> list[str]:
+    """Acepta `?ids=a&ids=b` y `?ids=a,b`; conserva el orden y quita duplicados."""
+    out = list(dict.fromkeys(i.strip() for raw in ids for i in raw.split(",") if i.strip()))
+    if not out:
+        raise HTTPException(status_code=400, detail="ids_required")
+    if len(out) > BATCH_GET_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"too_many_ids (max {BATCH_GET_MAX_IDS})")
+    # "a/b/c" apuntaría a una subcolección y "."/".." no son IDs válidos de Firestore
+    if any("/" in i or i in (".", "..") for i in out):
+        raise HTTPException(status_code=400, detail="invalid_id")
+    return out
+
+async def batch_get(db, collection: str, ids: list[str], to_dict, fields: list[str] | None = None) -> dict:
+    """Lee todos los documentos en un solo BatchGetDocuments (`get_all`).
+
+    `items` respeta el orden de `ids`; los que no existen se reportan en `missing`.
+    """
+    ids = parse_ids(ids)
+    col = db.collection(collection)
+    try:
+        refs = [col.document(i) for i in ids]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid_id")
+    found = {}
+    async for snap in db.get_all(refs, field_paths=fields):
+        if snap.exists:
+            found[snap.id] = to_dict(snap)
+    return {"items": [found[i] for i in ids if i in found],
+            "missing": [i for i in ids if i not in found]}
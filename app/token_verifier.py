@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from google.auth import exceptions as gauth_exc
+from google.auth import jwt
+from . import metrics
+
+# Certificados x509 con los que Firebase Auth firma los ID tokens (RS256)
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+CLOCK_SKEW_SECONDS = 60
+DEFAULT_CERTS_MAX_AGE = 3600  # si la respuesta no trae Cache-Control
+# Mínimo entre recargas forzadas por un `kid` desconocido: un token basura con kid aleatorio
+# no puede provocar una descarga por request
+CERTS_REFETCH_INTERVAL = 60
+
+def fetch_certs(url: str = FIREBASE_CERTS_URL) -> tuple[dict, float]:
+    """({kid: cert PEM}, max-age en segundos) según el Cache-Control de la respuesta."""
+    with urllib.request.urlopen(url, timeout=10) as resp:
+        certs = json.loads(resp.read())
+        match = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+    return certs, float(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+
+class TokenVerifier:
+    """Verificación de ID tokens de Firebase Auth.
+
+    Firma RS256 contra los certificados públicos de Google (cacheados según su max-age y
+    recargados si llega un `kid` desconocido, como mucho una vez cada `refetch_interval`
+    segundos), `aud` = proyecto, `iss` = https://securetoken.google.com/<proyecto>, `exp`/`iat`
+    y `sub` no vacío. La descarga no retiene el lock de los certificados ni el del LRU y solo la
+    hace un hilo a la vez; mientras tanto los demás siguen con la copia anterior si la hay.
+
+    Los tokens ya verificados se recuerdan en un LRU (clave sha256 del token) hasta su `exp`,
+    así el camino habitual no repite la verificación RSA. Contadores `auth.tokens.cache_hit`,
+    `auth.tokens.verified`, `auth.tokens.rejected`, `auth.certs.fetch` y
+    `auth.certs.refetch_throttled`.
+    """
+
+    def __init__(self, project_id: str | None, fetch=fetch_certs, cache_size: int = TOKEN_CACHE_SIZE,
+                 clock=time.time, refetch_interval: float = CERTS_REFETCH_INTERVAL):
+        self.project_id = project_id
+        self.fetch = fetch
+        self.cache_size = cache_size
+        self.clock = clock
+        self.refetch_interval = refetch_interval
+        # Locks separados: `cached()` (en el event loop) nunca espera a una descarga
+        self._certs_lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._tokens_lock = threading.Lock()
+        self._certs: dict = {}
+        self._certs_expire_at = 0.0
+        self._last_fetch = float("-inf")
+        self._verified: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+    def certs(self, force: bool = False) -> dict:
+        with self._certs_lock:
+            certs, expire_at, last_fetch = self._certs, self._certs_expire_at, self._last_fetch
+        now = self.clock()
+        if certs:
+            if now < expire_at and not force:
+                return certs
+            # Recarga forzada, o copia vencida tras un intento fallido: como mucho una por intervalo
+            if now - last_fetch < self.refetch_interval:
+                if force:
+                    metrics.incr("auth.certs.refetch_throttled")
+                return certs
+        # Con una copia (aunque esté vencida) no se espera a la descarga de otro hilo
+        if not self._fetch_lock.acquire(blocking=not certs):
+            return certs
+        try:
+            with self._certs_lock:
+                if self._last_fetch != last_fetch and self._certs:
+                    return self._certs  # otro hilo descargó mientras se esperaba el lock
+                # El intento cuenta para el intervalo aunque la descarga falle
+                self._last_fetch = now
+            fetched, max_age = self.fetch()
+            metrics.incr("auth.certs.fetch")
+            with self._certs_lock:
+                self._certs, self._certs_expire_at = fetched, self.clock() + max_age
+            return fetched
+        finally:
+            self._fetch_lock.release()
+
+    def cached(self, token: str) -> dict | None:
+        """Claims de un token ya verificado y todavía vigente, sin verificar la firma."""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        with self._tokens_lock:
+            entry = self._verified.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._verified[key]
+                return None
+            self._verified.move_to_end(key)
+        metrics.incr("auth.tokens.cache_hit")
+        return entry[1]
+
+    def _decode(self, token: str) -> dict:
+        if not self.project_id:
+            raise ValueError("project id not configured")
+        kid = jwt.decode_header(token).get("kid")
+        certs = self.certs()
+        if kid not in certs:
+            # Rotación de claves: el kid puede ser más nuevo que la copia cacheada
+            certs = self.certs(force=True)
+        claims = jwt.decode(token, certs=certs, audience=self.project_id,
+                            clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        if claims.get("iss") != f"https://securetoken.google.com/{self.project_id}":
+            raise ValueError("invalid issuer")
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise ValueError("invalid subject")
+        return claims
+
+    def verify(self, token: str) -> dict:
+        """Claims del token; ValueError si no es un ID token válido de este proyecto."""
+        claims = self.cached(token)
+        if claims is not None:
+            return claims
+        try:
+            claims = self._decode(token)
+        except (ValueError, gauth_exc.GoogleAuthError) as e:
+            metrics.incr("auth.tokens.rejected")
+            raise ValueError(str(e)) from e
+        metrics.incr("auth.tokens.verified")
+        if self.cache_size > 0:
+            key = hashlib.sha256(token.encode()).hexdigest()
+            with self._tokens_lock:
+                self._verified[key] = (float(claims["exp"]), claims)
+                self._verified.move_to_end(key)
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+        return claims
+
+verifier = TokenVerifier(os.getenv("GCLOUD_PROJECT") or os.getenv("GOOGLE_CLOUD_PROJECT"))
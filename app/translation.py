@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+from . import metrics
+from .deps import get_async_db
+from .prompt_stats import usage_of, account, record_rollups
+from .vertex import registry, limiter
+
+TRANSLATE_BATCH_WINDOW_MS = float(os.getenv("TRANSLATE_BATCH_WINDOW_MS", "20"))
+TRANSLATE_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATE_BATCH_MAX_ITEMS", "50"))
+# Llamadas individuales a la vez cuando falla el lote. Nunca más que la concurrencia del
+# limitador: el fallback de un lote de 50 no puede llenar su cola y responder 429 a todos
+TRANSLATE_FALLBACK_PARALLELISM = max(1, min(int(os.getenv("TRANSLATE_FALLBACK_PARALLELISM", "4")),
+                                            limiter.max_concurrency))
+
+TRANSLATE_CONFIG = {'max_output_tokens': 1024, 'temperature': 0.0}
+BATCH_CONFIG = {**TRANSLATE_CONFIG, 'response_mime_type': 'application/json'}
+
+async def _generate(prompt: str, generation_config: dict) -> str:
+    async with limiter.slot():
+        model = await registry.aget()
+        t0 = time.perf_counter()
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+    # Cada llamada al modelo (un lote o una frase del fallback) cuenta en las métricas y en los
+    # acumulados de prompt_stats igual que las de /prompts, sin documento en `prompts`
+    call = {"model": registry.default_model, "cacheStatus": "miss", "usage": usage_of(response),
+            "latencyMs": round((time.perf_counter() - t0) * 1000, 3), "ts": datetime.now(timezone.utc)}
+    account(call["model"], call, kind="translate")
+    await record_rollups(await get_async_db(), [call])
+    return response.text
+
+async def translate_one(source: str, target: str, text: str) -> str:
+    prompt = (f"Translate the following text from {source} to {target}. "
+              f"Respond with the translation only.\n\n{text}")
+    return (await _generate(prompt, TRANSLATE_CONFIG)).strip()
+
+def parse_batch(raw: str, n: int) -> list[str]:
+    """Array JSON de `n` strings; ValueError si la respuesta no tiene esa forma."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`").removeprefix("json").strip()
+    out = json.loads(raw)
+    if not isinstance(out, list) or len(out) != n or not all(isinstance(x, str) for x in out):
+        raise ValueError("unexpected batch shape")
+    return [x.strip() for x in out]
+
+async def translate_many(source: str, target: str, texts: list[str]) -> list[str | Exception]:
+    """Traduce `texts` con una sola llamada al modelo (prompt estructurado con un array JSON).
+
+    Si la respuesta no se puede interpretar se traduce cada texto por separado, hasta
+    TRANSLATE_FALLBACK_PARALLELISM a la vez; en ese caso un item que falla trae su excepción
+    en lugar del texto y el resto del lote no se ve afectado.
+    """
+    if len(texts) == 1:
+        return [await translate_one(source, target, texts[0])]
+    prompt = (f"Translate each string of the following JSON array from {source} to {target}. "
+              f"Respond only with a JSON array of {len(texts)} strings, with the translations "
+              f"in the same order.\n\n{json.dumps(texts, ensure_ascii=False)}")
+    raw = await _generate(prompt, BATCH_CONFIG)
+    try:
+        return parse_batch(raw, len(texts))
+    except ValueError:
+        metrics.incr("translate.batch.parse_failed")
+    sem = asyncio.Semaphore(TRANSLATE_FALLBACK_PARALLELISM)
+
+    async def one(text: str) -> str:
+        async with sem:
+            return await translate_one(source, target, text)
+    return list(await asyncio.gather(*[one(t) for t in texts], return_exceptions=True))
+
+class MicroBatcher:
+    """Agrupa las traducciones que llegan dentro de una ventana de `window_ms` por
+    (sourceLang, targetLang) y las resuelve con una sola llamada a `translate_many`.
+
+    El lote se despacha al cerrar la ventana o al llegar a `max_items`. Cada request espera
+    su propio future: un error del lote se propaga a todas las requests del lote y una
+    excepción en lugar de un resultado, solo a la request de ese item.
+    """
+
+    def __init__(self, translate_many, window_ms: float = TRANSLATE_BATCH_WINDOW_MS,
+                 max_items: int = TRANSLATE_BATCH_MAX_ITEMS):
+        self.translate_many = translate_many
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self._pending: dict[tuple[str, str], list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[tuple[str, str], asyncio.TimerHandle] = {}
+        # Referencias a los lotes en curso: asyncio solo guarda referencias débiles a las tasks
+        self._tasks: set[asyncio.Task] = set()
+
+    async def translate(self, source: str, target: str, text: str) -> str:
+        loop = asyncio.get_running_loop()
+        key = (source, target)
+        fut = loop.create_future()
+        pending = self._pending.setdefault(key, [])
+        pending.append((text, fut))
+        if len(pending) >= self.max_items:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await fut
+
+    def _flush(self, key: tuple[str, str]):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, None)
+        if items:
+            task = asyncio.ensure_future(self._run(key, items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: tuple[str, str], items: list[tuple[str, asyncio.Future]]):
+        metrics.incr("translate.batches")
+        metrics.incr("translate.items", len(items))
+        t0 = time.perf_counter()
+        try:
+            results = await self.translate_many(key[0], key[1], [text for text, _ in items])
+        except Exception as e:
+            for _, fut in items:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            metrics.observe_ms("translate.batch_ms", (time.perf_counter() - t0) * 1000)
+        for (_, fut), result in zip(items, results):
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+batcher = MicroBatcher(translate_many)
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import sys
+import time
+import unicodedata
+from . import metrics
+from .pagination import by_ts
+
+TM_SCAN_CHUNK = int(os.getenv("TM_SCAN_CHUNK", "1000"))  # documentos por página del escaneo
+TM_RETRY_SECONDS = float(os.getenv("TM_RETRY_SECONDS", "60"))  # espera tras un escaneo fallido
+TM_WARMUP = os.getenv("TM_WARMUP", "1") == "1"  # cargar el índice al arrancar
+
+_EDGE_PUNCT = " .,;:!?¡¿\"'«»"
+
+def normalize(text: str) -> str:
+    """Forma canónica de una frase: NFKC, minúsculas, espacios colapsados y sin puntuación en los bordes."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split()).strip(_EDGE_PUNCT)
+
+def tm_key(source: str, target: str, text: str) -> tuple[str, str, str]:
+    return (source.strip().lower(), target.strip().lower(), normalize(text))
+
+class TranslationMemory:
+    """Índice en memoria (sourceLang, targetLang, texto normalizado) -> traducción.
+
+    Se construye desde la colección `history` (el registro más reciente gana) en segundo plano,
+    al arrancar o con la primera traducción, recorriéndola por páginas de TM_SCAN_CHUNK
+    documentos. Mientras está frío las consultas no esperan: fallan (`tm.miss`) y la traducción
+    va al modelo. Si el escaneo falla se reintenta pasados TM_RETRY_SECONDS. Se mantiene al
+    día con cada alta en `history` y con las traducciones nuevas del modelo.
+    Contadores `tm.hit` / `tm.miss`.
+    """
+
+    def __init__(self, collection: str = "history", chunk: int = TM_SCAN_CHUNK,
+                 retry_seconds: float = TM_RETRY_SECONDS):
+        self.collection = collection
+        self.chunk = chunk
+        self.retry_seconds = retry_seconds
+        self._index: dict[tuple[str, str, str], str] = {}
+        # Altas hechas mientras se escanea `history`; None si no hay un build en curso
+        self._pending: dict[tuple[str, str, str], str] | None = None
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._loaded_at: float | None = None
+        self._failed_at: float | None = None
+        self._build_ms = 0.0
+        self._scanned = 0
+
+    async def _build(self, db):
+        """Escanea `history` por páginas keyset en un índice nuevo y lo reemplaza al final;
+        mientras tanto el índice anterior sigue respondiendo las consultas."""
+        t0 = time.perf_counter()
+        index: dict[tuple[str, str, str], str] = {}
+        scanned = 0
+        base = by_ts(db.collection(self.collection)
+                     .select(["sourceLang", "targetLang", "text", "result", "ts"]))
+        self._pending = {}
+        try:
+            last = None
+            while True:
+                q = base.start_after(last) if last is not None else base
+                n = 0
+                async for d in q.limit(self.chunk).stream():
+                    last = d
+                    n += 1
+                    data = d.to_dict() or {}
+                    if all(isinstance(data.get(k), str) for k in ("sourceLang", "targetLang", "text", "result")):
+                        index.setdefault(tm_key(data["sourceLang"], data["targetLang"], data["text"]), data["result"])
+                scanned += n
+                if n < self.chunk:
+                    break
+            # Las altas hechas durante el escaneo son más recientes que lo leído
+            index.update(self._pending)
+            self._index = index
+        finally:
+            self._pending = None
+        self._scanned = scanned
+        self._build_ms = (time.perf_counter() - t0) * 1000
+        self._loaded_at = time.time()
+        metrics.observe_ms("tm.build_ms", self._build_ms)
+        metrics.set_gauge("tm.entries", len(self._index))
+
+    async def _load(self, get_db):
+        async with self._lock:
+            if self._loaded_at is not None:
+                return
+            try:
+                await self._build(await get_db())
+            except Exception:
+                self._failed_at = time.monotonic()
+                metrics.incr("tm.build_failed")
+                raise
+
+    def warm(self, get_db) -> asyncio.Task | None:
+        """Lanza la carga inicial en segundo plano (si no está cargado ni cargándose).
+        `get_db` es la dependencia async que devuelve el cliente de Firestore."""
+        if self._loaded_at is not None or (self._task is not None and not self._task.done()):
+            return self._task
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+            return None
+        self._task = asyncio.ensure_future(self._load(get_db))
+        # El error ya quedó en tm.build_failed; se reintenta en la próxima traducción
+        self._task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._task
+
+    async def rebuild(self, db) -> dict:
+        async with self._lock:
+            await self._build(db)
+        return self.stats()
+
+    def lookup(self, source: str, target: str, text: str) -> str | None:
+        result = self._index.get(tm_key(source, target, text))
+        metrics.incr("tm.hit" if result is not None else "tm.miss")
+        return result
+
+    def add(self, source: str, target: str, text: str, result: str):
+        key = tm_key(source, target, text)
+        self._index[key] = result
+        if self._pending is not None:
+            self._pending[key] = result
+        metrics.set_gauge("tm.entries", len(self._index))
+
+    def stats(self) -> dict:
+        index = self._index
+        approx = sys.getsizeof(index) + sum(
+            sys.getsizeof(k) + sum(sys.getsizeof(p) for p in k) + sys.getsizeof(v)
+            for k, v in index.items())
+        return {
+            "entries": len(index),
+            "approx_bytes": approx,
+            "scanned_docs": self._scanned,
+            "build_ms": round(self._build_ms, 3),
+            "loaded_at": self._loaded_at,
+        }
+
+memory = TranslationMemory()
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from . import metrics
+from .clients import clients
+from .limiter import ConcurrencyLimiter
+
+if TYPE_CHECKING:
+    from vertexai.generative_models import GenerativeModel
+
+load_dotenv()
+
+PROJECT_ID = os.getenv("GCLOUD_PROJECT")
+LOCATION = os.getenv("VERTEX_LOCATION", "us-central1")
+MODEL_NAME = os.getenv("VERTEX_MODEL", "")
+VERTEX_MODEL_CACHE_SIZE = int(os.getenv("VERTEX_MODEL_CACHE_SIZE", "8"))
+VERTEX_MAX_CONCURRENCY = int(os.getenv("VERTEX_MAX_CONCURRENCY", "8"))
+VERTEX_MAX_QUEUE = int(os.getenv("VERTEX_MAX_QUEUE", "32"))
+VERTEX_QUEUE_TIMEOUT = float(os.getenv("VERTEX_QUEUE_TIMEOUT", "30"))
+
+def vertex_error(e: Exception) -> HTTPException:
+    """Traduce un error de Vertex a la respuesta HTTP que ven los clientes."""
+    error_msg = str(e)
+    if "403" in error_msg and "permission" in error_msg.lower():
+        return HTTPException(503, "Vertex AI permissions are still propagating. Please try again in a few minutes.")
+    elif "quota" in error_msg.lower():
+        return HTTPException(429, "Vertex AI quota exceeded. Please try again later.")
+    else:
+        return HTTPException(400, f"Vertex AI error: {error_msg}")
+
+class ModelRegistry:
+    """Inicializa Vertex una sola vez por proceso y reutiliza un GenerativeModel por nombre.
+
+    El SDK (aiplatform/vertexai) se importa e inicializa en la primera llamada, a través del
+    registro de clientes, no al importar la app. Los overrides de `model` se guardan en un
+    LRU acotado a VERTEX_MODEL_CACHE_SIZE modelos. Los tiempos de init/construcción quedan en
+    metrics (vertex.init_ms, vertex.construct_ms).
+    """
+
+    def __init__(self, project: str | None, location: str, default_model: str, max_models: int):
+        self.project = project
+        self.location = location
+        self.default_model = default_model
+        self.max_models = max_models
+        self._lock = threading.Lock()
+        self._models: OrderedDict[str, "GenerativeModel"] = OrderedDict()
+
+    def load_sdk(self):
+        """Factory del registro de clientes: importa e inicializa Vertex, devuelve GenerativeModel."""
+        t0 = time.perf_counter()
+        from google.cloud import aiplatform
+        from vertexai import init as vertex_init
+        from vertexai.generative_models import GenerativeModel
+        aiplatform.init(project=self.project, location=self.location)
+        vertex_init(project=self.project, location=self.location)
+        metrics.observe_ms("vertex.init_ms", (time.perf_counter() - t0) * 1000)
+        return GenerativeModel
+
+    def init(self):
+        return clients.get("vertex")
+
+    async def aget(self, name: str | None = None) -> "GenerativeModel":
+        """`get()` para handlers async: la primera inicialización del SDK corre en el threadpool."""
+        await clients.aget("vertex")
+        return self.get(name)
+
+    def get(self, name: str | None = None) -> "GenerativeModel":
+        name = name or self.default_model
+        t0 = time.perf_counter()
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+        if model is None:
+            model_cls = self.init()
+            t1 = time.perf_counter()
+            model = model_cls(name)
+            metrics.observe_ms("vertex.construct_ms", (time.perf_counter() - t1) * 1000)
+            with self._lock:
+                self._models[name] = model
+                self._models.move_to_end(name)
+                while len(self._models) > self.max_models:
+                    self._models.popitem(last=False)
+                    metrics.incr("vertex.models.evicted")
+            metrics.incr("vertex.models.miss")
+        else:
+            metrics.incr("vertex.models.hit")
+        metrics.observe_ms("vertex.get_model_ms", (time.perf_counter() - t0) * 1000)
+        return model
+
+registry = ModelRegistry(PROJECT_ID, LOCATION, MODEL_NAME, VERTEX_MODEL_CACHE_SIZE)
+clients.register("vertex", registry.load_sdk)
+
+# Llamadas a Vertex en curso por proceso; el resto espera en una cola acotada (429 si se llena)
+limiter = ConcurrencyLimiter("vertex", VERTEX_MAX_CONCURRENCY, VERTEX_MAX_QUEUE, VERTEX_QUEUE_TIMEOUT)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+bench_async_firestore.py — Compara el data path sync (threadpool) vs async (AsyncClient)
+con N clientes concurrentes contra el emulador de Firestore.
+
+Requisitos:
+  pip install -r requirements.txt httpx
+  gcloud emulators firestore start --host-port=localhost:8081
+  export FIRESTORE_EMULATOR_HOST=localhost:8081 GCLOUD_PROJECT=trailogo-dev
+
+Uso:
+  python bench/bench_async_firestore.py --concurrency 200 --requests 4000
+
+El modo async usa el router real de history (handlers `async def` + get_async_db);
+el modo sync usa un handler `def` equivalente con get_db, como estaba antes, que
+FastAPI ejecuta en el threadpool de AnyIO (40 hilos por defecto).
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+
+from app.deps import get_db
+from app.routers.history import router as history_router
+from app.serializers import history_to_dict
+
+def sync_app():
+    app = FastAPI()
+
+    @app.get("/api/v1/history/{doc_id}")
+    def get_history(doc_id: str, db=Depends(get_db)):
+        doc = db.collection("history").document(doc_id).get()
+        if not doc.exists:
+            raise HTTPException(status_code=404, detail="not_found")
+        return history_to_dict(doc)
+
+    return app
+
+def async_app():
+    app = FastAPI()
+    app.include_router(history_router, prefix="/api/v1/history")
+    return app
+
+def seed(n: int):
+    db = get_db()
+    batch = db.batch()
+    ids = []
+    for i in range(n):
+        ref = db.collection("history").document(f"bench_{i}")
+        batch.set(ref, {"userId": "uid_bench", "sourceLang": "es", "targetLang": "en",
+                        "inputType": "text", "text": "hola", "result": "hello"})
+        ids.append(ref.id)
+    batch.commit()
+    return ids
+
+async def run(app, ids, concurrency: int, total: int):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.get(f"/api/v1/history/{ids[i % len(ids)]}")
+                latencies.append((time.perf_counter() - t0) * 1000)
+                r.raise_for_status()
+
+        await one(0)  # calentamiento (crea clientes/canales)
+        latencies.clear()
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - t0
+    q = statistics.quantiles(latencies, n=100)
+    return {"p50_ms": q[49], "p99_ms": q[98], "rps": total / elapsed}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=200)
+    ap.add_argument("--requests", type=int, default=4000)
+    ap.add_argument("--docs", type=int, default=100)
+    args = ap.parse_args()
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("Define FIRESTORE_EMULATOR_HOST para correr contra el emulador")
+
+    ids = seed(args.docs)
+    print(f"Concurrencia: {args.concurrency}, requests: {args.requests}")
+    for name, factory in (("sync ", sync_app), ("async", async_app)):
+        res = asyncio.run(run(factory(), ids, args.concurrency, args.requests))
+        print(f"  {name}: p50={res['p50_ms']:.1f}ms p99={res['p99_ms']:.1f}ms rps={res['rps']:.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+bench_batch_create.py — Throughput de POST /history (un item por request) vs
+POST /history:batchCreate, contra el emulador de Firestore.
+
+Requisitos:
+  pip install -r requirements.txt httpx
+  export FIRESTORE_EMULATOR_HOST=localhost:8081 GCLOUD_PROJECT=trailogo-dev
+
+Uso:
+  python bench/bench_batch_create.py --items 300
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers.history import router as history_router
+
+def item(i: int) -> dict:
+    return {"userId": "uid_bench", "sourceLang": "es", "targetLang": "en",
+            "inputType": "text", "text": f"hola {i}", "result": f"hello {i}"}
+
+async def run(n: int):
+    app = FastAPI()
+    app.include_router(history_router, prefix="/api/v1/history")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/api/v1/history/", json=item(-1))  # calentamiento
+
+        # Como un teléfono que sincroniza su cola: un POST por traducción, en secuencia
+        t0 = time.perf_counter()
+        for i in range(n):
+            r = await client.post("/api/v1/history/", json=item(i))
+            r.raise_for_status()
+        single = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        r = await client.post("/api/v1/history:batchCreate", json={"items": [item(i) for i in range(n)]})
+        r.raise_for_status()
+        batch = time.perf_counter() - t0
+        assert r.json()["failed"] == 0, r.json()
+    return single, batch
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=300)
+    args = ap.parse_args()
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("Define FIRESTORE_EMULATOR_HOST para correr contra el emulador")
+
+    single, batch = asyncio.run(run(args.items))
+    print(f"Items: {args.items}")
+    print(f"  single     : {single:.2f}s ({args.items / single:.0f} items/s)")
+    print(f"  batchCreate: {batch:.2f}s ({args.items / batch:.0f} items/s), x{single / batch:.1f}")
+
+if __name__ == "__main__":
+    main()
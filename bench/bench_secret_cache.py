@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+bench_secret_cache.py — Lecturas repetidas de secretos contra un SecretManagerServiceClient
+falso local (latencia fija por access_secret_version), sin caché y con app/secret_cache.py.
+Comprueba además la invalidación al crear una versión nueva y el pinning de versiones.
+No requiere credenciales de GCP.
+
+Uso:
+  python bench/bench_secret_cache.py --reads 50 --latency-ms 40
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.secret_cache import SecretCache
+
+class FakeSecretManager:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.versions: dict[str, list[str]] = {}
+
+    def add_version(self, key: str, value: str):
+        self.versions.setdefault(key, []).append(value)
+
+    def access_secret_version(self, request: dict):
+        self.calls += 1
+        time.sleep(self.latency)
+        secret, version = request["name"].split("/versions/")
+        key = secret.rsplit("/", 1)[-1]
+        values = self.versions[key]
+        n = len(values) if version == "latest" else int(version)
+        return SimpleNamespace(name=f"{secret}/versions/{n}",
+                               payload=SimpleNamespace(data=values[n - 1].encode("utf-8")))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reads", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=40)
+    args = ap.parse_args()
+
+    name = "projects/demo/secrets/api-key"
+    client = FakeSecretManager(args.latency_ms / 1000)
+    client.add_version("api-key", "v1")
+
+    t0 = time.perf_counter()
+    for _ in range(args.reads):
+        client.access_secret_version(request={"name": f"{name}/versions/latest"})
+    uncached = time.perf_counter() - t0
+
+    client.calls = 0
+    cache = SecretCache(ttl=60)
+    t0 = time.perf_counter()
+    for _ in range(args.reads):
+        cache.access(client, name, "api-key")
+    cached = time.perf_counter() - t0
+    print(f"Lecturas de latest: {args.reads}")
+    print(f"  sin caché: {uncached * 1000:.1f} ms ({args.reads} llamadas)")
+    print(f"  con caché: {cached * 1000:.1f} ms ({client.calls} llamada)")
+    assert client.calls == 1
+
+    # Nueva versión: latest se invalida, la versión 1 sigue en caché
+    client.add_version("api-key", "v2")
+    cache.invalidate("api-key", aliases_only=True)
+    assert cache.access(client, name, "api-key") == {"value": "v2", "version": "2"}
+    calls = client.calls
+    assert cache.access(client, name, "api-key", "1") == {"value": "v1", "version": "1"}
+    assert cache.access(client, name, "api-key", "2")["value"] == "v2"
+    assert client.calls == calls  # ambas versiones se guardaron al resolver latest
+    cache.invalidate("api-key")
+    cache.access(client, name, "api-key", "1")
+    assert client.calls == calls + 1
+    print("  invalidación y pinning de versiones: ok")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+bench_serializers.py — Serializa 10k snapshots de history con el camino anterior
+de list_history (_doc_to_dict con hasattr/try + response_model=dict, que FastAPI valida y
+serializa con un TypeAdapter(dict) + json.dumps de JSONResponse) y con app/serializers.py (convertidor precompilado + orjson). No requiere Firestore.
+
+Uso:
+  python bench/bench_serializers.py --docs 10000
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from pydantic import TypeAdapter
+
+from app.serializers import dumps, history_to_dict
+
+class FakeSnapshot:
+    def __init__(self, i: int):
+        self.id = f"doc{i:06d}"
+        self._data = {
+            "userId": f"uid_{i % 500}", "sourceLang": "es", "targetLang": "en",
+            "inputType": "text", "text": f"hola mundo {i}", "result": f"hello world {i}",
+            "ts": DatetimeWithNanoseconds(2025, 1, 1, 12, 0, i % 60, tzinfo=timezone.utc),
+        }
+
+    def to_dict(self):
+        return dict(self._data)
+
+def legacy_doc_to_dict(doc):
+    d = doc.to_dict() or {}
+    d["id"] = doc.id
+    for k in ("ts", "createdAt", "updatedAt"):
+        v = d.get(k)
+        try:
+            if hasattr(v, "to_datetime"):
+                d[k] = v.to_datetime().isoformat()
+            elif hasattr(v, "isoformat"):
+                d[k] = v.isoformat()
+        except Exception:
+            pass
+    return d
+
+RESPONSE_DICT = TypeAdapter(dict)
+
+def legacy(docs):
+    # Lo que hacía list_history: response_model=dict -> field.validate + field.serialize
+    # (mode="json") en FastAPI y después JSONResponse.render
+    content = {"items": [legacy_doc_to_dict(d) for d in docs]}
+    content = RESPONSE_DICT.dump_python(RESPONSE_DICT.validate_python(content), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+def current(docs):
+    return dumps({"items": [history_to_dict(d) for d in docs]})
+
+def timed(fn, docs, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=10000)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    docs = [FakeSnapshot(i) for i in range(args.docs)]
+    old = timed(legacy, docs, args.rounds)
+    new = timed(current, docs, args.rounds)
+    print(f"Snapshots: {args.docs} (mejor de {args.rounds})")
+    print(f"  anterior   : {old * 1000:.1f} ms")
+    print(f"  serializers: {new * 1000:.1f} ms (x{old / new:.1f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+bench_singleflight.py — Lanza N prompts idénticos concurrentes contra un modelo falso local
+(latencia fija) con y sin app/singleflight.py, y comprueba que con coalescencia se hace
+una sola llamada upstream y que un error upstream llega a todos los que esperaban.
+
+Después repite la prueba por el camino real de POST /prompts (`run_prompt`: clave de caché,
+`generate_and_cache`, limitador, estados miss/coalesced y errores de `generate`) con el
+registro de modelos y Firestore reemplazados por falsos en memoria.
+No requiere Vertex ni Firestore.
+
+Uso:
+  python bench/bench_singleflight.py --requests 50 --latency-ms 300
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import HTTPException
+
+from app.routers import ai
+from app.singleflight import SingleFlight
+
+class FakeModel:
+    def __init__(self, latency: float, fail: bool = False):
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, generation_config=None):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return FakeResponse(f"out:{prompt}")
+
+class FakeResponse:
+    usage_metadata = None
+
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeRegistry:
+    def __init__(self, model: FakeModel):
+        self.model = model
+
+    async def aget(self, name=None):
+        return self.model
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+class FakeDocument:
+    def __init__(self, docs: dict, key: str):
+        self.docs, self.key = docs, key
+
+    async def get(self):
+        return FakeSnapshot(self.docs.get(self.key))
+
+    async def set(self, data):
+        self.docs[self.key] = data
+
+class FakeDB:
+    """Solo lo que usa app/prompt_cache.py: collection(...).document(key).get()/set()."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return self
+
+    def document(self, key):
+        return FakeDocument(self.docs, key)
+
+async def run(model: FakeModel, n: int, flight: SingleFlight | None):
+    prompt = "translate 'gracias' to French"
+
+    async def one():
+        if flight is None:
+            return await model.generate_content_async(prompt)
+        return await flight.do(prompt, lambda: model.generate_content_async(prompt))
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*[one() for _ in range(n)], return_exceptions=True)
+    return results, time.perf_counter() - t0
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    args = ap.parse_args()
+    latency = args.latency_ms / 1000
+
+    plain = FakeModel(latency)
+    await run(plain, args.requests, None)
+    coalesced = FakeModel(latency)
+    results, elapsed = await run(coalesced, args.requests, SingleFlight("bench"))
+    results = [r.text for r in results]
+    print(f"Prompts idénticos concurrentes: {args.requests}")
+    print(f"  sin single-flight: {plain.calls} llamadas upstream")
+    print(f"  con single-flight: {coalesced.calls} llamada(s) upstream en {elapsed * 1000:.0f} ms")
+    assert coalesced.calls == 1, coalesced.calls
+    assert all(r == results[0] for r in results)
+
+    failing = FakeModel(latency, fail=True)
+    results, _ = await run(failing, args.requests, SingleFlight("bench"))
+    errors = sum(1 for r in results if isinstance(r, RuntimeError))
+    print(f"  error upstream   : {failing.calls} llamada, {errors}/{args.requests} requests reciben el error")
+    assert failing.calls == 1 and errors == args.requests
+
+    await run_prompt_path(args.requests, latency)
+
+async def run_prompt_path(n: int, latency: float):
+    """N `run_prompt` concurrentes, el camino de POST /prompts, con modelo y Firestore falsos."""
+    db = FakeDB()
+
+    async def wave(model: FakeModel, prompt: str):
+        ai.registry = FakeRegistry(model)
+        body = ai.PromptIn(prompt=prompt)
+        return await asyncio.gather(*[ai.run_prompt(db, body) for _ in range(n)], return_exceptions=True)
+
+    model = FakeModel(latency)
+    calls = await wave(model, "translate 'gracias' to German")
+    statuses = sorted(c["cacheStatus"] for c in calls)
+    print(f"run_prompt x{n}: {model.calls} llamada(s) upstream, "
+          f"{statuses.count('miss')} miss + {statuses.count('coalesced')} coalesced")
+    assert model.calls == 1, model.calls
+    assert statuses == ["coalesced"] * (n - 1) + ["miss"], statuses
+    assert all(c["output"] == calls[0]["output"] for c in calls)
+
+    # Segunda ola del mismo prompt: la respuesta ya está en la caché
+    again = await wave(model, "translate 'gracias' to German")
+    assert model.calls == 1 and all(c["cacheStatus"] == "memory" for c in again)
+
+    failing = FakeModel(latency, fail=True)
+    calls = await wave(failing, "translate 'gracias' to Italian")
+    errors = [c for c in calls if isinstance(c, HTTPException)]
+    print(f"  error upstream: {failing.calls} llamada, {len(errors)}/{n} requests reciben HTTP "
+          f"{errors[0].status_code if errors else '-'}")
+    assert failing.calls == 1 and len(errors) == n
+    assert len(db.docs) == 1  # un error no se cachea: solo está la respuesta de la primera ola
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py — Mide el arranque en frío de la API y falla si empeora:
+
+  1. `python -X importtime -c "import app.main"`: tiempo total de import y los módulos más caros.
+  2. Que los SDKs pesados (Vertex AI, Secret Manager, Firebase Admin) NO se importen al arrancar;
+     deben cargarse en el primer uso a través de app/clients.py.
+  3. Tiempo hasta el primer `GET /healthz` 200 levantando uvicorn en un subproceso.
+
+No requiere credenciales: ningún endpoint de datos se llama.
+
+Uso:
+  python bench/bench_startup.py --max-import-ms 1500 --max-healthz-ms 4000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Deben cargarse en el primer uso, nunca al importar app.main
+LAZY_MODULES = ("vertexai", "google.cloud.aiplatform", "google.cloud.secretmanager", "firebase_admin")
+
+def importtime(top: int):
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                          cwd=ROOT, capture_output=True, text=True, env=_env())
+    if proc.returncode != 0:
+        sys.exit(f"import app.main falló:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self [us] | cumulative | imported package"
+        _, cumulative_us, name = (p.strip() for p in line.removeprefix("import time:").split("|"))
+        rows.append((int(cumulative_us), name))
+    total_us = next((us for us, name in rows if name == "app.main"), 0)
+    heaviest = sorted(((us, name) for us, name in rows if name.startswith(("app", "google", "fastapi", "firebase", "vertexai"))),
+                      reverse=True)[:top]
+    return total_us / 1000, heaviest
+
+def lazy_modules_loaded() -> list[str]:
+    code = ("import sys, app.main; "
+            f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))")
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, env=_env())
+    return [m for m in proc.stdout.strip().split(",") if m]
+
+def time_to_healthz(port: int, timeout: float) -> float:
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=ROOT, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=0.5) as r:
+                    if r.status == 200:
+                        return (time.perf_counter() - t0) * 1000
+            except OSError:
+                time.sleep(0.02)
+        sys.exit(f"/healthz no respondió en {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("GCLOUD_PROJECT", "bench-startup")
+    return env
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--max-import-ms", type=float, default=1500)
+    ap.add_argument("--max-healthz-ms", type=float, default=4000)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    failures = []
+    import_ms, heaviest = importtime(args.top)
+    print(f"import app.main: {import_ms:.0f} ms (límite {args.max_import_ms:.0f} ms)")
+    for us, name in heaviest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    if import_ms > args.max_import_ms:
+        failures.append(f"import app.main {import_ms:.0f} ms > {args.max_import_ms:.0f} ms")
+
+    eager = lazy_modules_loaded()
+    print(f"SDKs cargados al importar: {', '.join(eager) or 'ninguno'}")
+    if eager:
+        failures.append(f"SDKs importados al arrancar: {', '.join(eager)}")
+
+    healthz_ms = time_to_healthz(args.port, timeout=max(10.0, args.max_healthz_ms / 1000 * 3))
+    print(f"primer /healthz: {healthz_ms:.0f} ms (límite {args.max_healthz_ms:.0f} ms)")
+    if healthz_ms > args.max_healthz_ms:
+        failures.append(f"primer /healthz {healthz_ms:.0f} ms > {args.max_healthz_ms:.0f} ms")
+
+    if failures:
+        sys.exit("REGRESIÓN: " + "; ".join(failures))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+bench_token_verify.py — Verificaciones por segundo de ID tokens con app/token_verifier.py,
+con y sin el LRU de tokens verificados. Usa un par de claves RSA local y un certificado
+x509 autofirmado en lugar de los de Google, y comprueba además que se rechazan tokens con
+firma, audiencia, issuer o exp inválidos, que un `kid` nuevo recarga los certificados (como
+mucho una vez por intervalo, aunque lleguen tokens basura con kids aleatorios) y que una
+descarga lenta no bloquea `cached()`. No requiere red ni credenciales.
+
+Uso:
+  python bench/bench_token_verify.py --seconds 2
+"""
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from app.token_verifier import TokenVerifier
+
+PROJECT = "bench-project"
+
+def key_pair(kid: str):
+    """(signer, cert PEM) de un par RSA 2048 local, como los de securetoken@system."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    signer = crypt.RSASigner.from_string(pem, key_id=kid)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def id_token(signer, uid: str, **overrides) -> str:
+    now = int(time.time())
+    payload = {"iss": f"https://securetoken.google.com/{PROJECT}", "aud": PROJECT,
+               "sub": uid, "user_id": uid, "auth_time": now, "iat": now, "exp": now + 3600}
+    payload.update(overrides)
+    return jwt.encode(signer, payload).decode()
+
+def rate(verifier: TokenVerifier, tokens: list[str], seconds: float) -> float:
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        verifier.verify(tokens[n % len(tokens)])
+        n += 1
+    return n / (time.perf_counter() - t0)
+
+def rejected(verifier: TokenVerifier, token: str) -> bool:
+    try:
+        verifier.verify(token)
+    except ValueError:
+        return True
+    return False
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=2.0)
+    ap.add_argument("--tokens", type=int, default=100, help="tokens distintos en rotación")
+    args = ap.parse_args()
+
+    signer, cert = key_pair("k1")
+    certs = {"k1": cert}
+    fetches = []
+    fetch_delay = [0.0]
+
+    def fetch():
+        fetches.append(time.time())
+        time.sleep(fetch_delay[0])
+        return dict(certs), 3600
+
+    tokens = [id_token(signer, f"uid-{i}") for i in range(args.tokens)]
+    uncached = rate(TokenVerifier(PROJECT, fetch=fetch, cache_size=0), tokens, args.seconds)
+    cached = rate(TokenVerifier(PROJECT, fetch=fetch), tokens, args.seconds)
+    print(f"Verificaciones/s ({args.tokens} tokens en rotación)")
+    print(f"  sin LRU: {uncached:10.0f}")
+    print(f"  con LRU: {cached:10.0f} (x{cached / uncached:.0f})")
+
+    # Reloj del verificador (caché de certificados y LRU); exp/iat se validan con la hora real
+    now = [time.time()]
+    v = TokenVerifier(PROJECT, fetch=fetch, clock=lambda: now[0])
+    fetches.clear()
+    assert v.verify(tokens[0])["sub"] == "uid-0"
+    other, _ = key_pair("k1")
+    assert rejected(v, id_token(other, "mallory")), "firma"
+    assert rejected(v, id_token(signer, "u", aud="otro-proyecto")), "aud"
+    assert rejected(v, id_token(signer, "u", iss="https://example.com")), "iss"
+    assert rejected(v, id_token(signer, "u", iat=int(time.time()) - 7200, exp=int(time.time()) - 3600)), "exp"
+    assert rejected(v, id_token(signer, "")), "sub"
+    assert len(fetches) == 1  # certificados cacheados según max-age
+
+    # Tokens basura con kid aleatorio dentro del intervalo: ninguna recarga extra
+    for _ in range(20):
+        garbage = jwt.encode(signer, {"sub": "mallory"}, key_id=uuid.uuid4().hex).decode()
+        assert rejected(v, garbage), "kid desconocido"
+    assert len(fetches) == 1, len(fetches)
+
+    signer2, cert2 = key_pair("k2")
+    certs["k2"] = cert2
+    assert rejected(v, id_token(signer2, "uid-rotated")), "recarga limitada por intervalo"
+    now[0] += v.refetch_interval
+    assert v.verify(id_token(signer2, "uid-rotated"))["sub"] == "uid-rotated"
+    assert len(fetches) == 2  # kid nuevo pasado el intervalo: recarga de certificados
+
+    # Una descarga lenta (certificados vencidos) no bloquea el camino cacheado
+    now[0] += 3600
+    fetch_delay[0] = 1.0
+    t = threading.Thread(target=v.certs)
+    t.start()
+    time.sleep(0.1)
+    t0 = time.perf_counter()
+    v.cached(tokens[0])
+    blocked_ms = (time.perf_counter() - t0) * 1000
+    t.join()
+    assert blocked_ms < 50, blocked_ms
+    print("  rechazos (firma, aud, iss, exp, sub), rotación de claves, recarga limitada y")
+    print(f"  cached() durante una descarga de 1 s ({blocked_ms:.1f} ms): ok")
+
+if __name__ == "__main__":
+    main()
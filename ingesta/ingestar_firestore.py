@@ -96,7 +96,7 @@ def coerce_types(collection: str, row: Dict[str, Any]) -> Dict[str, Any]:
         if "ts" not in data or not data["ts"]:
             data["ts"] = now()
     elif collection == "flags":
-        # Campos: key(str), value(any), type(bool|str|num|json), scope(str), updatedAt(ts)
+        # Campos: key(str), value(any), type(bool|str|num|json), scope(str), userId(str, requerido si scope=user), updatedAt(ts)
         if "type" in data:
             t = str(data["type"]).lower()
             if t == "bool":
@@ -184,6 +184,8 @@ def generate_synthetic(collection: str, n: int) -> List[Dict[str, Any]]:
                 "scope": rng.choice(["global","user"]),
                 "updatedAt": now()
             })
+            if items[-1]["scope"] == "user":
+                items[-1]["userId"] = f"uid_{rng.randint(100,999)}"
     return items
 
 def load_source(collection: str, file: Optional[str], generate: Optional[int]) -> List[Dict[str, Any]]: